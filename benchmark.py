@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+import os
+import sys
+import json
+import random
+import time
+import socket
+import argparse
+import threading
+import subprocess
+
+from http.client import HTTPConnection
+from urllib.request import urlopen
+
+"""
+Helpers
+"""
+
+
+def median(values):
+    """Get the median of a list of values"""
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2
+
+
+def report(name, values, unit='s'):
+    """Print the min/median/max of a list of measurements"""
+    print('{0:<24} min {1:9.3f}{4}  median {2:9.3f}{4}  max {3:9.3f}{4}'.format(
+        name, min(values), median(values), max(values), unit))
+
+
+def wait_for_port(port, timeout):
+    """Block until something is listening on the port, return False on timeout"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.01)
+    return False
+
+
+def process_status(pid):
+    """Get the thread count and resident memory (in kB) of a process, from /proc"""
+    status = {}
+    with open('/proc/%d/status' % pid) as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            status[name] = value.strip()
+    return int(status['Threads']), int(status['VmRSS'].split()[0])
+
+
+def start_server(port, timeout, *extra_args):
+    """Start server.py and wait until its devices are probed"""
+    start = time.time()
+    server = subprocess.Popen([sys.executable, 'server.py', '--port', str(port)] + list(extra_args),
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if not wait_for_port(port, timeout):
+        server.terminate()
+        server.wait()
+        raise RuntimeError('Server did not start listening within %d seconds' % timeout)
+
+    while time.time() - start < timeout:
+        with urlopen('http://127.0.0.1:%d/api/ready' % port) as response:
+            if json.loads(response.read().decode('utf8'))['ready']:
+                break
+        time.sleep(0.01)
+    return server
+
+
+"""
+Benchmarks
+"""
+
+
+def bench_startup(args):
+    """Measure the time until the server is listening and until its devices are probed"""
+    listening = []
+    ready = []
+    for _ in range(args.runs):
+        start = time.time()
+        server = subprocess.Popen([sys.executable, 'server.py', '--port', str(args.port)],
+                                  cwd=os.path.dirname(os.path.abspath(__file__)),
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_for_port(args.port, args.timeout):
+                print('Server did not start listening within %d seconds' % args.timeout)
+                return 1
+            listening.append(time.time() - start)
+
+            while time.time() - start < args.timeout:
+                with urlopen('http://127.0.0.1:%d/api/ready' % args.port) as response:
+                    if json.loads(response.read().decode('utf8'))['ready']:
+                        break
+                time.sleep(0.01)
+            ready.append(time.time() - start)
+        finally:
+            server.terminate()
+            server.wait()
+
+    report('listening', listening)
+    report('devices ready', ready)
+    return 0
+
+
+def bench_runtime(args):
+    """Compare the thread count, memory usage and request latency of the runtimes"""
+    for runtime in ('threads', 'asyncio'):
+        server = start_server(args.port, args.timeout, '--runtime', runtime)
+        try:
+            # Let the control loops settle
+            time.sleep(1)
+            threads, rss = process_status(server.pid)
+
+            latencies = []
+            connection = HTTPConnection('127.0.0.1', args.port)
+            for _ in range(args.requests):
+                start = time.perf_counter()
+                connection.request('POST', '/api/movement/forward/0')
+                connection.getresponse().read()
+                latencies.append((time.perf_counter() - start) * 1000)
+            connection.close()
+        finally:
+            server.terminate()
+            server.wait()
+
+        print('{0}: {1} threads, {2} kB RSS'.format(runtime, threads, rss))
+        report('%s latency' % runtime, latencies, 'ms')
+    return 0
+
+
+def bench_rules(args):
+    """Measure the cost of evaluating the actions when a single sensor value changes"""
+    from rules import RuleIndex, evaluate
+
+    random.seed(0)
+    for ports in args.ports:
+        for rule_count in args.rules:
+            # Every action compares two values of random ports (synthetic addresses, so there can be many)
+            addresses = ['in%d' % i for i in range(ports)]
+            actions = [{
+                'address': random.choice(addresses),
+                'action': 'distance_centimeters',
+                'condition': {'operator': random.choice(['and', 'or']), 'conditions': [
+                    {'comparison': '<', 'compare_with': random.randint(0, 100)},
+                    {'address': random.choice(addresses), 'action': 'distance_centimeters',
+                     'comparison': '>', 'compare_with': random.randint(0, 100)}
+                ]},
+                'when_true': [],
+                'when_false': []
+            } for _ in range(rule_count)]
+
+            rules = RuleIndex(actions)
+            values = {port: 50 for port in rules.ports}
+            rules.update(values)
+
+            incremental = []
+            full = []
+            for _ in range(args.ticks):
+                port = random.choice(rules.ports)
+                values[port] = random.randint(0, 100)
+
+                start = time.perf_counter()
+                rules.update(values)
+                incremental.append((time.perf_counter() - start) * 1e6)
+
+                # What a loop without the dependency index does: evaluate every action
+                start = time.perf_counter()
+                for compiled in rules.conditions:
+                    evaluate(compiled, values)
+                full.append((time.perf_counter() - start) * 1e6)
+
+            print('{0} ports, {1} rules:'.format(ports, rule_count))
+            report('indexed', incremental, 'us')
+            report('full', full, 'us')
+    return 0
+
+
+def bench_scheduler(args):
+    """Measure how late the scheduler performs timed steps, with many sequences waiting at once"""
+    from scheduler import Scheduler
+
+    random.seed(0)
+    for count in args.sequences:
+        lateness = []
+        finished = threading.Event()
+
+        def execute(step):
+            lateness.append((time.time() - step['due']) * 1000)
+            if len(lateness) == count:
+                finished.set()
+
+        scheduler = Scheduler(execute)
+        runner = threading.Thread(target=scheduler.run)
+        runner.setDaemon(True)
+        runner.start()
+
+        # Every sequence waits a random time before its (single) timed step
+        start = time.time()
+        for _ in range(count):
+            wait = random.uniform(0, args.spread)
+            scheduler.start([{'steps': [], 'wait': wait},
+                             {'method': 'GET', 'url': '/', 'due': time.time() + wait}])
+        scheduling = time.time() - start
+        threads = threading.active_count()
+
+        finished.wait(args.spread + 10)
+        scheduler.stop()
+
+        print('{0} sequences: started in {1:.3f}s, {2} threads'.format(count, scheduling, threads))
+        report('lateness', lateness, 'ms')
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks for the Lego Mindstorms REST API')
+    subparsers = parser.add_subparsers(dest='benchmark')
+
+    startup = subparsers.add_parser('startup', help='cold start time of server.py')
+    startup.add_argument('--runs', type=int, default=5, help='number of cold starts')
+    startup.add_argument('--port', type=int, default=8080, help='port number to serve on')
+    startup.add_argument('--timeout', type=int, default=120, help='maximum time (in seconds) per start')
+    startup.set_defaults(func=bench_startup)
+
+    runtime = subparsers.add_parser('runtime', help='thread count, memory and latency of the threads/asyncio runtimes')
+    runtime.add_argument('--requests', type=int, default=200, help='number of requests to time')
+    runtime.add_argument('--port', type=int, default=8080, help='port number to serve on')
+    runtime.add_argument('--timeout', type=int, default=120, help='maximum time (in seconds) to start')
+    runtime.set_defaults(func=bench_runtime)
+
+    rules = subparsers.add_parser('rules', help='evaluation cost of the action conditions per changed sensor value')
+    rules.add_argument('--rules', type=int, nargs='+', default=[10, 100, 1000], help='numbers of actions')
+    rules.add_argument('--ports', type=int, nargs='+', default=[4, 16, 64], help='numbers of sensor ports')
+    rules.add_argument('--ticks', type=int, default=1000, help='number of changed values to time')
+    rules.set_defaults(func=bench_rules)
+
+    scheduler = subparsers.add_parser('scheduler', help='timing of the action sequences as their number grows')
+    scheduler.add_argument('--sequences', type=int, nargs='+', default=[10, 1000, 10000],
+                           help='numbers of sequences waiting at the same time')
+    scheduler.add_argument('--spread', type=float, default=2, help='longest wait (in seconds) of a sequence')
+    scheduler.set_defaults(func=bench_scheduler)
+
+    args = parser.parse_args()
+    if args.benchmark is None:
+        parser.print_help()
+        sys.exit(1)
+
+    sys.exit(args.func(args))
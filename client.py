@@ -1,5 +1,6 @@
 import json
-from urllib.parse import urlencode
+import asyncio
+from urllib.parse import urlencode, urlsplit, quote
 
 from falcon.testing import StartResponseMock, create_environ
 
@@ -49,3 +50,121 @@ class Client:
                 response.data = json.loads(response.data)
 
         return response
+
+
+class RobotResponse:
+    """Response of a robot, mimics the attributes of `StartResponseMock` used by `Client`"""
+
+    def __init__(self, status, headers, data):
+        self.status = status
+        self.headers_dict = headers
+        self.content_type = headers.get('content-type', '')
+        self.data = data
+        if data and self.content_type.startswith('application/json'):
+            self.data = json.loads(data.decode('utf8'))
+        elif isinstance(data, bytes):
+            try:
+                self.data = data.decode('utf8')
+            except UnicodeDecodeError:
+                pass
+
+    @property
+    def code(self):
+        return int(self.status.split(' ', 1)[0])
+
+
+class RobotClient(Client):
+    """Asynchronous client for a remote robot, keeping a pool of keep-alive connections"""
+
+    def __init__(self, base_url, pool_size=2, timeout=5):
+        parsed = urlsplit(base_url)
+        self.base_url = base_url
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.idle = []
+        self.semaphore = None
+
+    async def call(self, method, url, body='', headers=None, params=None, query_string='', scheme='http', **kwargs):
+        """Performs a call against the robot, reusing an idle connection when possible"""
+        headers = {} if headers is None else headers
+        if not isinstance(body, str) and 'json' in headers.get('content-type', 'application/json'):
+            body = output_format.json(body)
+            headers.setdefault('content-type', 'application/json')
+        body = body.encode('utf8') if isinstance(body, str) else body
+        if body:
+            headers.setdefault('content-type', 'application/json')
+
+        params = params if params else {}
+        params.update(kwargs)
+        if params:
+            query_string = '{}{}{}'.format(query_string, '&' if query_string else '', urlencode(params, True))
+        target = quote(url) + ('?' + query_string if query_string else '')
+
+        request = ['{} {} HTTP/1.1'.format(method, target), 'Host: {}:{}'.format(self.host, self.port),
+                   'Content-Length: {}'.format(len(body))]
+        request.extend('{}: {}'.format(name, value) for name, value in headers.items())
+        request = ('\r\n'.join(request) + '\r\n\r\n').encode('iso-8859-1') + body
+
+        # Created lazily, so it belongs to the event loop we are called from
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.pool_size)
+
+        async with self.semaphore:
+            # An idle connection may have been closed by the robot in the meantime, retry once on a new one
+            while self.idle:
+                reader, writer = self.idle.pop()
+                try:
+                    return await asyncio.wait_for(self.round_trip(reader, writer, request), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                except Exception:
+                    writer.close()
+                    raise
+
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+            try:
+                return await asyncio.wait_for(self.round_trip(reader, writer, request), self.timeout)
+            except Exception:
+                writer.close()
+                raise
+
+    async def round_trip(self, reader, writer, request):
+        """Send a request and read its response, keeping the connection if the robot allows it"""
+        writer.write(request)
+        await writer.drain()
+
+        status_line = await reader.readuntil(b'\r\n')
+        version, status = status_line.decode('iso-8859-1').rstrip('\r\n').split(' ', 1)
+
+        headers = {}
+        while True:
+            line = (await reader.readuntil(b'\r\n')).decode('iso-8859-1').rstrip('\r\n')
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        if status.startswith(('204', '304')):
+            data = b''
+        elif 'content-length' in headers:
+            data = await reader.readexactly(int(headers['content-length']))
+        else:
+            # Without a length, the response ends when the connection closes
+            data = await reader.read()
+            keep_alive = False
+
+        if keep_alive:
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+
+        return RobotResponse(status, headers, data)
+
+    def close(self):
+        """Close all idle connections"""
+        while self.idle:
+            reader, writer = self.idle.pop()
+            writer.close()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+
+import json
+import asyncio
+import logging
+import argparse
+import threading
+
+import hug
+
+from hug.api import INTRO
+from falcon import HTTP_400
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import make_server, WSGIServer
+from marshmallow import fields
+from marshmallow.validate import Range, OneOf
+
+from client import RobotClient
+from schemas import RobotSchema, ApiCall
+
+"""
+Global variables
+"""
+# Create logger
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+# Define port number to serve on
+port_number = 8080
+
+# Event loop owning the connections to the robots
+loop = asyncio.new_event_loop()
+
+# Clients of the robots, keyed by name (not `robots`, that's the query parameter selecting robots in the routes)
+robot_clients = {}
+
+"""
+Threading
+"""
+
+
+class EventLoop(threading.Thread):
+    """Simple thread running the event loop of the robot connections"""
+
+    def __init__(self, event_loop):
+        self.loop = event_loop
+        threading.Thread.__init__(self)
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    """WSGI server handling each connection in its own thread, so a long batch doesn't hold up the kill switch"""
+    daemon_threads = True
+
+
+"""
+Helpers
+"""
+
+
+def read_json(filename):
+    """Read data from a file"""
+    with open(filename, encoding='utf-8', mode='r') as f:
+        data = json.load(f)
+    return data
+
+
+async def call_robot(name, calls):
+    """Perform a sequence of calls on a single robot"""
+    results = []
+    for call in calls:
+        try:
+            result = await robot_clients[name].call(call['method'], call['url'], call.get('body', ''))
+        except (OSError, EOFError, ValueError, asyncio.TimeoutError) as e:
+            log.error('Call to robot %s failed: %r', name, e)
+            results.append({'message': 'Robot unreachable', 'code': 502})
+            break
+
+        results.append({'data': result.data, 'code': result.code})
+
+        # Should we wait before performing another call?
+        if 'wait' in call:
+            await asyncio.sleep(call['wait'])
+    return results
+
+
+async def fan_out(names, calls):
+    """Perform a sequence of calls on several robots concurrently"""
+    results = await asyncio.gather(*[call_robot(name, calls) for name in names])
+    return dict(zip(names, results))
+
+
+def broadcast(calls, names=None):
+    """Send a sequence of calls to the given robots (or all robots), blocking until every robot answered"""
+    names = list(robot_clients) if not names else names
+    future = asyncio.run_coroutine_threadsafe(fan_out(names, calls), loop)
+    return future.result()
+
+
+def unknown_robots(names):
+    """Get the names that don't belong to a robot of the fleet"""
+    return [name for name in names or [] if name not in robot_clients]
+
+
+def single_results(results):
+    """Flatten the results of a single call per robot"""
+    return {'robots': {name: calls[0] for name, calls in results.items()}, 'code': 200}
+
+
+"""
+Hug routes
+"""
+
+
+@hug.not_found()
+def not_found():
+    return {'message': '404 Not Found', 'code': 404}
+
+
+@hug.get('/api/fleet')
+def get_fleet():
+    """Get the robots of the fleet"""
+    return {name: robot.base_url for name, robot in robot_clients.items()}
+
+
+@hug.post('/api/fleet/killswitch')
+def fleet_kill_switch(response, robots: hug.types.delimited_list(',')=None):
+    """Shut off all motors of every robot (or the given robots)"""
+    unknown = unknown_robots(robots)
+    if unknown:
+        response.status = HTTP_400
+        return {'message': 'Unknown robot(s): %s' % ', '.join(unknown), 'code': 400}
+
+    return single_results(broadcast([{'method': 'POST', 'url': '/api/motor/killswitch'}], robots))
+
+
+@hug.post('/api/fleet/movement/{direction}/{speed_percentage}')
+def fleet_move_to_direction(direction: fields.Str(validate=OneOf(['forward', 'backward', 'left', 'right'])),
+                            speed_percentage: fields.Int(validate=Range(min=0, max=100)),
+                            response,
+                            robots: hug.types.delimited_list(',')=None):
+    """Move every robot (or the given robots) towards a specific direction"""
+    unknown = unknown_robots(robots)
+    if unknown:
+        response.status = HTTP_400
+        return {'message': 'Unknown robot(s): %s' % ', '.join(unknown), 'code': 400}
+
+    url = '/api/movement/%s/%d' % (direction, speed_percentage)
+    return single_results(broadcast([{'method': 'POST', 'url': url}], robots))
+
+
+@hug.post('/api/fleet/config')
+def fleet_set_config(body: fields.Nested(RobotSchema),
+                     response,
+                     robots: hug.types.delimited_list(',')=None):
+    """Push a config to every robot (or the given robots)"""
+    unknown = unknown_robots(robots)
+    if unknown:
+        response.status = HTTP_400
+        return {'message': 'Unknown robot(s): %s' % ', '.join(unknown), 'code': 400}
+
+    return single_results(broadcast([{'method': 'POST', 'url': '/api/config', 'body': json.dumps(body)}], robots))
+
+
+@hug.get('/api/fleet/sensor/{address}')
+def fleet_get_sensor_value(address: fields.Str(validate=OneOf(['in1', 'in2', 'in3', 'in4'])),
+                           response,
+                           robots: hug.types.delimited_list(',')=None):
+    """Get the sensor value from an address of every robot (or the given robots)"""
+    unknown = unknown_robots(robots)
+    if unknown:
+        response.status = HTTP_400
+        return {'message': 'Unknown robot(s): %s' % ', '.join(unknown), 'code': 400}
+
+    return single_results(broadcast([{'method': 'GET', 'url': '/api/sensor/%s' % address}], robots))
+
+
+@hug.post('/api/fleet/batch')
+def fleet_batch(body: fields.Nested(ApiCall, many=True),
+                response,
+                robots: hug.types.delimited_list(',')=None):
+    """Perform a sequence of API calls on every robot (or the given robots), robots run concurrently"""
+    unknown = unknown_robots(robots)
+    if unknown:
+        response.status = HTTP_400
+        return {'message': 'Unknown robot(s): %s' % ', '.join(unknown), 'code': 400}
+
+    return {'robots': broadcast(body, robots), 'code': 200}
+
+
+"""
+Server
+"""
+
+# Define API server
+app = hug.API(__name__).http.server()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gateway controlling a fleet of robots')
+    parser.add_argument('--port', type=int, default=port_number, help='port number to serve on')
+    parser.add_argument('--robots', default='fleet.json', help='JSON file mapping robot names to their base URL')
+    parser.add_argument('--pool-size', type=int, default=2, help='maximum number of connections per robot')
+    parser.add_argument('--timeout', type=float, default=5, help='timeout (in seconds) of a call to a robot')
+    args = parser.parse_args()
+
+    print(INTRO)
+
+    for name, base_url in read_json(args.robots).items():
+        robot_clients[name] = RobotClient(base_url, args.pool_size, args.timeout)
+
+    # Start the event loop
+    event_loop = EventLoop(loop)
+    event_loop.setDaemon(True)
+    event_loop.start()
+
+    # Create a server listening on a specific port number
+    httpd = make_server('', args.port, app, ThreadingWSGIServer)
+    print("Serving {0} robot(s) on port {1}...".format(len(robot_clients), args.port))
+    httpd.serve_forever()
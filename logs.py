@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+import sys
+import json
+import queue
+import logging
+
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Attributes every log record has, anything else was passed through `extra`
+RECORD_ATTRIBUTES = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime'}
+
+# Names of the log levels that can be set per subsystem
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record as a single line of JSON, including the fields passed through `extra`"""
+
+    def format(self, record):
+        data = {
+            'time': round(record.created, 3),
+            'level': record.levelname,
+            'subsystem': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        data.update((key, value) for key, value in record.__dict__.items() if key not in RECORD_ATTRIBUTES)
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Queue handler that leaves the formatting to the listener thread. The logging
+    thread only pays for creating the record, so the arguments of a log call must
+    not be modified afterwards (config snapshots and results never are).
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(filename=None, max_bytes=1024 * 1024, backup_count=3, level=logging.INFO):
+    """
+    Route all logging through a queue, a background listener writes the records to
+    the console and (if a filename is given) as JSON to a rotating file. Returns
+    the started listener.
+    """
+    records = queue.Queue()
+
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(logging.Formatter('%(levelname)s:%(name)s:%(message)s'))
+    handlers = [console]
+
+    if filename:
+        # At most (backup_count + 1) * max_bytes of logs are kept
+        log_file = RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        log_file.setFormatter(JsonFormatter())
+        handlers.append(log_file)
+
+    root = logging.getLogger()
+    root.handlers = [DeferredQueueHandler(records)]
+    root.setLevel(level)
+
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
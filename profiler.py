@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+import os
+import sys
+import time
+import threading
+
+from collections import Counter
+
+
+class SamplingProfiler(threading.Thread):
+    """Simple thread sampling the call stacks of all other threads"""
+
+    def __init__(self, interval=0.01, max_overhead=0.05, max_depth=64):
+        # Time (in seconds) between two samples
+        self.interval = interval
+        # Maximum fraction of the CPU time the profiler may spend sampling
+        self.max_overhead = max_overhead
+        # Maximum number of frames to record per stack
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = None
+        self.stopped = None
+        self.running = True
+        self.lock = threading.Lock()
+        self.e = threading.Event()
+        threading.Thread.__init__(self)
+
+    def run(self):
+        self.started = time.time()
+        while self.running:
+            start = time.perf_counter()
+            self.sample()
+            elapsed = time.perf_counter() - start
+
+            # Back off if sampling takes more than the allowed share of the CPU (waking up early on stop)
+            self.e.wait(max(self.interval, elapsed * (1 - self.max_overhead) / self.max_overhead))
+        self.stopped = time.time()
+
+    def sample(self):
+        """Record the current stack of every thread, except our own"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == self.ident:
+                continue
+
+            frames = []
+            while frame is not None:
+                frames.append(frame.f_code)
+                frame = frame.f_back
+
+            # Truncate deep stacks at the leaf end, so they still merge with their root frames
+            stack = [names.get(thread_id, 'Thread-%d' % thread_id)]
+            stack.extend('%s (%s)' % (code.co_name, os.path.basename(code.co_filename))
+                         for code in reversed(frames[-self.max_depth:]))
+            stacks.append(';'.join(stack))
+
+        with self.lock:
+            self.stacks.update(stacks)
+            self.samples += 1
+
+    def collapsed(self):
+        """Get the aggregated stacks in the collapsed-stack format used by flame graph tools"""
+        with self.lock:
+            lines = ['%s %d' % (stack, count) for stack, count in sorted(self.stacks.items())]
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def stats(self):
+        """Get a summary of the current profiling session"""
+        end = self.stopped if self.stopped is not None else time.time()
+        return {
+            'running': self.running,
+            'interval': self.interval,
+            'max_overhead': self.max_overhead,
+            'samples': self.samples,
+            'stacks': len(self.stacks),
+            'duration': round(end - self.started, 3) if self.started is not None else 0
+        }
+
+    def stop(self):
+        self.running = False
+        self.e.set()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+import sys
+import json
+import time
+import random
+import argparse
+
+from rules import RuleIndex
+from scheduler import Scheduler
+from schemas import ActionSchema, SENSOR_ADDRESSES
+
+"""
+Helpers
+"""
+
+
+def read_json(filename):
+    """Read data from a file"""
+    with open(filename, encoding='utf-8', mode='r') as f:
+        data = json.load(f)
+    return data
+
+
+def load_actions(filename):
+    """Load and validate the actions of a config file"""
+    actions, errors = ActionSchema(many=True).load(read_json(filename)['actions'])
+    if errors:
+        raise ValueError('Invalid actions: %s' % json.dumps(errors))
+    return actions
+
+
+def synthetic_trace(actions, samples, interval=0.01, seed=0):
+    """
+    Generate a trace for the ports the actions depend on: every sample moves one
+    random port by a random step, touch sensors just flip.
+    """
+    rng = random.Random(seed)
+    ports = RuleIndex(actions).ports
+    values = {port: 0 for port in ports}
+
+    trace = []
+    for i in range(samples):
+        address, value_key = port = rng.choice(ports)
+        if value_key == 'is_pressed':
+            values[port] = 1 - values[port]
+        else:
+            values[port] = max(0, min(255, values[port] + rng.randint(-10, 10)))
+        trace.append({'time': round(i * interval, 6), 'sensors': {address: {value_key: values[port]}}})
+    return trace
+
+
+def compare_calls(calls, expected, tolerance=1e-6):
+    """Compare the performed API calls with the expected calls, returns a list of differences"""
+    differences = []
+    for i, (call, expected_call) in enumerate(zip(calls, expected)):
+        same_time = abs(call['time'] - expected_call['time']) <= tolerance
+        if not same_time or any(call.get(key) != expected_call.get(key) for key in ('method', 'url', 'body')):
+            differences.append('Call %d: expected %s, got %s' % (i, json.dumps(expected_call), json.dumps(call)))
+    if len(calls) != len(expected):
+        differences.append('Expected %d calls, got %d' % (len(expected), len(calls)))
+    return differences
+
+
+"""
+Replay
+"""
+
+
+class Replay:
+    """
+    Feed a sensor trace through the actions, recording the API calls they perform and
+    when. The action sequences run on the scheduler the server uses, but on a virtual
+    clock that jumps from event to event, so waiting costs no time.
+    """
+
+    def __init__(self, actions, tick=0.001):
+        self.rules = RuleIndex(actions)
+        self.now = 0.0
+        self.scheduler = Scheduler(self.execute, lambda: self.now, tick)
+        self.values = {port: None for port in self.rules.ports}
+        self.calls = []
+
+    def execute(self, step):
+        """Record the API call of a step, at the time it was due"""
+        call = {'time': round(self.scheduler.time, 6), 'method': step['method'], 'url': step['url']}
+        if 'body' in step:
+            call['body'] = step['body']
+        self.calls.append(call)
+
+    def advance_to(self, when):
+        """Move the virtual clock forward, running the steps that are due on the way"""
+        self.now = when
+        self.scheduler.run_due(when)
+
+    def feed(self, sample):
+        """Feed a single sample of the trace"""
+        self.advance_to(sample['time'])
+
+        for address, sensor_values in sample['sensors'].items():
+            for value_key, value in sensor_values.items():
+                self.values[address, value_key] = value
+
+        self.rules.start(self.values, self.scheduler)
+        self.scheduler.run_due(self.now)
+
+    def run(self, trace, drain=60):
+        """
+        Replay a whole trace and the `drain` seconds after it (so sequences repeating
+        forever end), returns the samples per second.
+        """
+        start = time.perf_counter()
+        for sample in trace:
+            self.feed(sample)
+        duration = time.perf_counter() - start
+
+        self.advance_to(self.now + drain)
+        self.scheduler.cancel_all()
+        return len(trace) / duration if duration else float('inf')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a sensor trace through the actions of a config')
+    parser.add_argument('trace', nargs='?',
+                        help='JSON file with a list of samples: {"time": 0.5, "sensors": {"in1": {"is_pressed": 1}}}')
+    parser.add_argument('--config', default='config.json', help='config file holding the actions')
+    parser.add_argument('--synthetic', type=int, metavar='SAMPLES',
+                        help='replay a generated trace of this amount of samples instead')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated trace')
+    parser.add_argument('--expected', help='JSON file with the API calls the trace should lead to')
+    parser.add_argument('--drain', type=float, default=60,
+                        help='seconds to keep running the action sequences after the trace')
+    parser.add_argument('--record', help='write the performed API calls to this JSON file')
+    args = parser.parse_args()
+
+    if args.trace is None and args.synthetic is None:
+        parser.error('either a trace or --synthetic is required')
+
+    actions = load_actions(args.config)
+    trace = synthetic_trace(actions, args.synthetic, seed=args.seed) if args.synthetic else read_json(args.trace)
+
+    unknown = {address for sample in trace for address in sample['sensors'] if address not in SENSOR_ADDRESSES}
+    if unknown:
+        parser.error('unknown sensor address(es) in trace: %s' % ', '.join(sorted(unknown)))
+
+    replay = Replay(actions)
+    samples_per_second = replay.run(trace, args.drain)
+
+    print('{0} samples, {1} API calls, {2:.0f} samples/sec'.format(len(trace), len(replay.calls), samples_per_second))
+
+    if args.record:
+        with open(args.record, encoding='utf-8', mode='w') as f:
+            json.dump(replay.calls, f, indent=4)
+
+    if args.expected:
+        differences = compare_calls(replay.calls, read_json(args.expected))
+        for difference in differences:
+            print(difference)
+        sys.exit(1 if differences else 0)
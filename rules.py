@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+import json
+
+# Marks a port whose value hasn't been read yet
+UNKNOWN = object()
+
+
+def matches_condition(value, condition):
+    """Compare a sensor value with a (single) condition"""
+    comparison = condition['comparison']
+    compare_with = condition['compare_with']
+
+    if comparison == '==':
+        return value == compare_with
+    elif comparison == '!=':
+        return value != compare_with
+    elif comparison == '>':
+        return value > compare_with
+    elif comparison == '<':
+        return value < compare_with
+    elif comparison == '>=':
+        return value >= compare_with
+    elif comparison == '<=':
+        return value <= compare_with
+    elif comparison == 'between':
+        # Interval comparison (same as `value >= compare_with and value <= compare_with2`):
+        return compare_with <= value <= condition['compare_with2']
+    return False
+
+
+def compile_condition(condition, address, value_key):
+    """
+    Compile a condition into nested tuples, every comparison gets the port it reads
+    (an `(address, value_key)` pair, defaulting to the port of the action).
+    """
+    if 'operator' in condition:
+        return condition['operator'], tuple(compile_condition(child, address, value_key)
+                                            for child in condition['conditions'])
+    return 'compare', (condition.get('address', address), condition.get('action', value_key)), condition
+
+
+def condition_ports(compiled):
+    """Get the ports a compiled condition depends on"""
+    operator, operand = compiled[0], compiled[1]
+    if operator == 'compare':
+        return {operand}
+    return set().union(*(condition_ports(child) for child in operand))
+
+
+def evaluate(compiled, values):
+    """
+    Evaluate a compiled condition against the port values. A port without a value
+    makes a comparison unknown (`None`), which only decides the outcome when the
+    known comparisons don't (e.g. `False and None` is `False`).
+    """
+    operator, operand = compiled[0], compiled[1]
+    if operator == 'compare':
+        value = values.get(operand)
+        if value is None or value is UNKNOWN:
+            return None
+        return matches_condition(value, compiled[2])
+
+    if operator == 'not':
+        result = evaluate(operand[0], values)
+        return None if result is None else not result
+
+    # Short-circuit on the deciding outcome: False for `and`, True for `or`
+    deciding = operator == 'or'
+    outcome = not deciding
+    for child in operand:
+        result = evaluate(child, values)
+        if result is None:
+            outcome = None
+        elif result == deciding:
+            return deciding
+    return outcome
+
+
+def action_key(action):
+    """Get a key identifying an action by its content (its condition, port and steps)"""
+    return json.dumps(action, sort_keys=True)
+
+
+class RuleIndex:
+    """
+    Evaluates the conditions of the actions incrementally. The index of which actions
+    depend on which port is built once, when the actions are loaded, so a changed port
+    value only re-evaluates the actions reading that port.
+    """
+
+    def __init__(self, actions, previous=None):
+        self.actions = actions
+        self.conditions = [compile_condition(action['condition'], action['address'], action['action'])
+                           for action in actions]
+
+        # Indexes of the actions depending on a port, keyed by port
+        self.dependents = {}
+        for i, compiled in enumerate(self.conditions):
+            for port in condition_ports(compiled):
+                self.dependents.setdefault(port, []).append(i)
+
+        # Ports that need to be read, every port is read once regardless of the number of actions using it
+        self.ports = tuple(self.dependents)
+
+        self.values = dict.fromkeys(self.ports, UNKNOWN)
+        self.outcomes = [None] * len(actions)
+        # Id of the sequence each action started last (see `start`)
+        self.sequences = [None] * len(actions)
+        if previous is not None:
+            self.keep_outcomes(previous)
+
+    def keep_outcomes(self, previous):
+        """
+        Take over the outcomes (and sequences) of the actions that are unchanged since a
+        previous index, so editing the actions doesn't do those actions again. Every port
+        value starts unknown, so all actions are evaluated on the next update, but only
+        new, changed or flipped actions are done.
+        """
+        unchanged = {}
+        for i, action in enumerate(previous.actions):
+            unchanged.setdefault(action_key(action), []).append((previous.outcomes[i], previous.sequences[i]))
+        for i, action in enumerate(self.actions):
+            kept = unchanged.get(action_key(action))
+            if kept:
+                self.outcomes[i], self.sequences[i] = kept.pop(0)
+
+    def update(self, values):
+        """Feed the current port values, returns `(index, steps)` for every action whose outcome changed"""
+        dirty = set()
+        for port, value in values.items():
+            if self.values.get(port, UNKNOWN) != value:
+                self.values[port] = value
+                dirty.update(self.dependents.get(port, ()))
+
+        exec_actions = []
+        for i in sorted(dirty):
+            outcome = evaluate(self.conditions[i], self.values)
+
+            # Do the action once (and nothing while the outcome is unknown)
+            if outcome is None or outcome == self.outcomes[i]:
+                continue
+
+            self.outcomes[i] = outcome
+            action = self.actions[i]
+            exec_actions.append((i, action['when_true'] if outcome else action['when_false']))
+        return exec_actions
+
+    def start(self, values, scheduler):
+        """
+        Feed the current port values and start the sequence of every action whose outcome
+        changed. The sequence an action started before is cancelled, so a sequence that
+        repeats until cancelled doesn't outlive the outcome that started it.
+        """
+        for i, steps in self.update(values):
+            if self.sequences[i] is not None:
+                scheduler.cancel(self.sequences[i])
+            self.sequences[i] = scheduler.start(steps, 'action %d' % i)
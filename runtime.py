@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+import io
+import sys
+import asyncio
+import logging
+
+from urllib.parse import unquote
+from concurrent.futures import ThreadPoolExecutor
+
+# Requests are logged by the access subsystem, like the threaded server does
+log = logging.getLogger('access')
+
+# Largest request body we accept (uploaded sounds and images included)
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+# Close idle connections after this amount of seconds
+IDLE_TIMEOUT = 30
+
+
+class WSGIServer:
+    """
+    HTTP/1.1 server running a WSGI app inside the event loop. The app is called
+    inline, so every handler must be quick, except for the requests listed in
+    `offload` (`(method, path)` pairs), which run in a single worker thread.
+    """
+
+    def __init__(self, app, port, host='', upgrades=None, offload=()):
+        self.app = app
+        self.host = host
+        self.port = port
+        # WebSocket handlers taking over the connection, keyed by path
+        self.upgrades = upgrades or {}
+        # Requests that block (e.g. while probing devices), the worker is started by the first of them
+        self.offload = {(method, path.rstrip('/')) for method, path in offload}
+        self.executor = None
+        self.server = None
+
+    async def start(self):
+        # A numeric host is not resolved, resolving would start the default executor's thread
+        self.server = await asyncio.start_server(self.handle_connection, self.host or '0.0.0.0', self.port)
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    async def handle_connection(self, reader, writer):
+        peer = writer.get_extra_info('peername') or ('', 0)
+        try:
+            keep_alive = True
+            while keep_alive:
+                keep_alive = await self.handle_request(reader, writer, peer)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, reader, writer, peer):
+        """Handle a single request, returns whether the connection can be kept alive"""
+        request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+        if not request_line:
+            return False
+
+        try:
+            method, target, version = request_line.decode('iso-8859-1').rstrip('\r\n').split(' ', 2)
+        except ValueError:
+            writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            return False
+
+        headers = []
+        while True:
+            line = (await reader.readuntil(b'\r\n')).decode('iso-8859-1').rstrip('\r\n')
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers.append((name.strip(), value.strip()))
+
+        environ = self.get_environ(method, target, version, headers, peer)
+
+        upgrade = self.upgrades.get(environ['PATH_INFO'])
+        if upgrade is not None and environ.get('HTTP_UPGRADE', '').lower() == 'websocket':
+            await upgrade(reader, writer, environ)
+            return False
+
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        if length > MAX_BODY_SIZE:
+            writer.write(b'HTTP/1.1 413 Payload Too Large\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            return False
+        environ['wsgi.input'] = io.BytesIO(await reader.readexactly(length) if length else b'')
+
+        keep_alive = version == 'HTTP/1.1' and environ.get('HTTP_CONNECTION', '').lower() != 'close'
+
+        response = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            response['status'] = status
+            response['headers'] = response_headers
+            return lambda data: None
+
+        if (method, environ['PATH_INFO'].rstrip('/')) in self.offload:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(1)
+            body = await asyncio.get_event_loop().run_in_executor(self.executor, self.call_app,
+                                                                  environ, start_response)
+        else:
+            body = self.call_app(environ, start_response)
+
+        lines = ['HTTP/1.1 ' + response['status']]
+        lines.extend('%s: %s' % (name, value) for name, value in response['headers']
+                     if name.lower() not in ('content-length', 'connection'))
+        lines.append('Content-Length: %d' % len(body))
+        if not keep_alive:
+            lines.append('Connection: close')
+
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('iso-8859-1'))
+        if method != 'HEAD':
+            writer.write(body)
+        await writer.drain()
+
+        log.info('%s - - "%s" %s %d', peer[0], request_line.decode('iso-8859-1').rstrip('\r\n'),
+                 response['status'].split(' ', 1)[0], len(body))
+        return keep_alive
+
+    def call_app(self, environ, start_response):
+        """Call the app, returns the body of its response"""
+        result = self.app(environ, start_response)
+        try:
+            return b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    def get_environ(self, method, target, version, headers, peer):
+        path, _, query = target.partition('?')
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': unquote(path, 'iso-8859-1'),
+            'QUERY_STRING': query,
+            'SERVER_NAME': self.host or 'localhost',
+            'SERVER_PORT': str(self.port),
+            'SERVER_PROTOCOL': version,
+            'REMOTE_ADDR': peer[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': False,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False
+        }
+        for name, value in headers:
+            key = name.upper().replace('-', '_')
+            if key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                environ[key] = value
+            elif 'HTTP_' + key in environ:
+                environ['HTTP_' + key] += ',' + value
+            else:
+                environ['HTTP_' + key] = value
+        return environ
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+import time
+import threading
+
+import ev3dev.ev3 as ev3
+
+MOTOR_ADDRESSES = ('outA', 'outB', 'outC', 'outD')
+SENSOR_ADDRESSES = ('in1', 'in2', 'in3', 'in4')
+
+# Fields of a snapshot that can be selected (`connected` is always included)
+MOTOR_FIELDS = ('state', 'duty_cycle', 'position', 'speed')
+SENSOR_FIELDS = ('value', 'mode', 'type')
+
+
+def read_motor(motor):
+    """Read the fields of a motor"""
+    return {
+        'connected': True,
+        'state': motor.state,
+        'duty_cycle': motor.duty_cycle,
+        'position': motor.position,
+        'speed': motor.speed
+    }
+
+
+def read_sensor(sensor, sensor_type):
+    """Read the fields of a sensor"""
+    return {
+        'connected': True,
+        'value': sensor.value(),
+        'mode': sensor.mode,
+        'type': sensor_type or sensor.driver_name
+    }
+
+
+def select_fields(snapshot, selected):
+    """Get a copy of a snapshot holding only the selected fields of every device"""
+    keep = set(selected) | {'connected'}
+    return {
+        'time': snapshot['time'],
+        'motors': {address: {key: value for key, value in state.items() if key in keep}
+                   for address, state in snapshot['motors'].items()},
+        'sensors': {address: {key: value for key, value in state.items() if key in keep}
+                    for address, state in snapshot['sensors'].items()}
+    }
+
+
+class DeviceSampler:
+    """
+    Timestamped snapshot of every motor and sensor port, shared by all requests. A
+    snapshot is sampled on demand and reused until it's `max_age` seconds old.
+    """
+
+    def __init__(self, max_age=0.1, probe_interval=5):
+        self.max_age = max_age
+        self.probe_interval = probe_interval
+        self.snapshot = None
+        # Devices of the ports nothing is configured for, keyed by address
+        self.probes = {}
+        self.lock = threading.Lock()
+
+    def probe(self, address, device_class):
+        """Get a device for an unconfigured port, a disconnected port is probed again after `probe_interval`"""
+        probed = self.probes.get(address)
+        if probed is None or (not probed[1].connected and time.time() - probed[0] > self.probe_interval):
+            probed = self.probes[address] = (time.time(), device_class(address))
+        return probed[1]
+
+    def sample(self, motors, sensors, sensor_types):
+        """Read every port, configured devices are read through their own objects"""
+        snapshot = {'time': time.time(), 'motors': {}, 'sensors': {}}
+
+        for address in MOTOR_ADDRESSES:
+            motor = motors.get(address)
+            if motor is None:
+                motor = self.probe(address, ev3.Motor)
+            try:
+                snapshot['motors'][address] = read_motor(motor) if motor.connected else {'connected': False}
+            except OSError:
+                # Unplugged while reading (`connected` stays set), so it's probed again next time
+                self.probes.pop(address, None)
+                snapshot['motors'][address] = {'connected': False}
+
+        for address in SENSOR_ADDRESSES:
+            sensor = sensors.get(address)
+            if sensor is None:
+                sensor = self.probe(address, ev3.Sensor)
+            try:
+                snapshot['sensors'][address] = read_sensor(sensor, sensor_types.get(address)) \
+                    if sensor.connected else {'connected': False}
+            except OSError:
+                self.probes.pop(address, None)
+                snapshot['sensors'][address] = {'connected': False}
+        return snapshot
+
+    def get(self, motors, sensors, sensor_types):
+        """Get the current snapshot, sampling a new one when it's too old"""
+        snapshot = self.snapshot
+        if snapshot is not None and time.time() - snapshot['time'] < self.max_age:
+            return snapshot
+
+        with self.lock:
+            # Another request may have sampled while we were waiting for the lock
+            snapshot = self.snapshot
+            if snapshot is None or time.time() - snapshot['time'] >= self.max_age:
+                snapshot = self.snapshot = self.sample(motors, sensors, sensor_types)
+        return snapshot
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+import math
+import time
+import uuid
+import asyncio
+import logging
+import threading
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Steps are API calls performed for the actions, so errors are logged by that subsystem
+log = logging.getLogger('actions')
+
+
+class Timer:
+    """A callback due at a tick of a timer wheel"""
+    __slots__ = ('tick', 'callback', 'cancelled', 'fired')
+
+    def __init__(self, tick, callback):
+        self.tick = tick
+        self.callback = callback
+        self.cancelled = False
+        # Taken off the wheel as due, its callback may not have run yet
+        self.fired = False
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel: a timer goes into the slot of its tick (modulo the number of
+    slots), so scheduling costs the same for any delay and advancing a tick only
+    visits a single slot. Timers more than a turn away stay in their slot until
+    their turn comes.
+    """
+
+    def __init__(self, origin, tick=0.01, slots=256):
+        self.origin = origin
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.current = 0
+        self.pending = 0
+
+    def tick_time(self, tick):
+        """Get the time of a tick"""
+        return self.origin + tick * self.tick
+
+    def schedule(self, when, callback):
+        """Schedule a callback at a time (rounded up to a tick), returns its timer"""
+        # Never early, but don't let float rounding push an exact tick to the next one
+        tick = max(math.ceil((when - self.origin) / self.tick - 1e-9), self.current + 1)
+        timer = Timer(tick, callback)
+        self.slots[tick % len(self.slots)].append(timer)
+        self.pending += 1
+        return timer
+
+    def cancel(self, timer):
+        """Cancel a timer, it's dropped once its slot comes around (a fired timer is no longer counted)"""
+        if not timer.cancelled and not timer.fired:
+            timer.cancelled = True
+            self.pending -= 1
+
+    def advance(self, now):
+        """
+        Move towards the tick of `now`, stopping at the first tick with due timers (so
+        timers those schedule for the ticks after it aren't skipped). Returns the
+        callbacks of the due timers, in order.
+        """
+        target = math.floor((now - self.origin) / self.tick + 1e-9)
+        if not self.pending:
+            # Nothing to visit, so jump instead of walking through the empty ticks
+            self.current = max(self.current, target)
+            return []
+
+        while self.current < target and self.pending:
+            self.current += 1
+            slot = self.slots[self.current % len(self.slots)]
+            if not slot:
+                continue
+
+            due = []
+            remaining = []
+            for timer in slot:
+                if timer.cancelled:
+                    continue
+                if timer.tick <= self.current:
+                    timer.fired = True
+                    self.pending -= 1
+                    due.append(timer.callback)
+                else:
+                    remaining.append(timer)
+            slot[:] = remaining
+            if due:
+                return due
+        self.current = max(self.current, target)
+        return []
+
+
+class Sequence:
+    """A running action sequence"""
+
+    def __init__(self, name, steps, started):
+        self.id = uuid.uuid4().hex[:8]
+        self.name = name
+        self.steps = steps
+        self.started = started
+        self.calls = 0
+        self.timers = set()
+        self.cancelled = False
+
+    def status(self):
+        return {'id': self.id, 'name': self.name, 'started': self.started, 'calls': self.calls,
+                'pending_timers': len(self.timers)}
+
+
+class Scheduler:
+    """
+    Runs action sequences as continuations on a timer wheel, so a waiting step costs
+    a timer instead of a sleeping thread. Waits are measured from the time a step
+    was due (not from when it ran), so a sequence doesn't drift. Every step is
+    performed by `execute(step)`, from `run` or `run_async` (or calls of `run_due`),
+    except for the steps `blocking(step)` is true for: those run in a pool of
+    `workers` threads, so they don't hold up the other sequences.
+    """
+
+    def __init__(self, execute, clock=time.time, tick=0.01, slots=256, blocking=None, workers=2):
+        self.execute = execute
+        self.clock = clock
+        self.tick = tick
+        self.blocking = blocking
+        self.workers = workers
+        # Started by the first blocking step
+        self.executor = None
+        self.wheel = TimerWheel(clock(), tick, slots)
+        # Continuations to run right away, in order
+        self.ready = deque()
+        self.sequences = {}
+        # Time at which the continuation being run was due
+        self.time = self.wheel.origin
+        self.running = True
+        self.lock = threading.RLock()
+        self.e = threading.Event()
+
+    def start(self, steps, name=None):
+        """Start running a sequence of steps, returns its id"""
+        with self.lock:
+            sequence = Sequence(name, steps, self.clock())
+            self.sequences[sequence.id] = sequence
+            self.ready.append((sequence.started, lambda: self.run_steps(sequence, steps, 0, self.finish(sequence))))
+        self.e.set()
+        return sequence.id
+
+    def cancel(self, sequence_id):
+        """Cancel a running sequence, returns whether it was running"""
+        with self.lock:
+            sequence = self.sequences.pop(sequence_id, None)
+            if sequence is None:
+                return False
+            sequence.cancelled = True
+            for timer in sequence.timers:
+                self.wheel.cancel(timer)
+            sequence.timers.clear()
+        return True
+
+    def cancel_all(self):
+        """Cancel every running sequence, returns the number of cancelled sequences"""
+        with self.lock:
+            return sum(self.cancel(sequence_id) for sequence_id in list(self.sequences))
+
+    def status(self):
+        """Get the status of every running sequence"""
+        with self.lock:
+            return [sequence.status() for sequence in self.sequences.values()]
+
+    def finish(self, sequence):
+        """Get the continuation ending a sequence"""
+        def finished():
+            with self.lock:
+                self.sequences.pop(sequence.id, None)
+        return finished
+
+    def call_at(self, sequence, when, continuation):
+        """Continue a sequence at a time, right away (in order) when that time has come"""
+        with self.lock:
+            if sequence.cancelled:
+                return
+            if when <= self.time:
+                self.ready.append((self.time, continuation))
+                return
+
+            def fire():
+                with self.lock:
+                    sequence.timers.discard(timer)
+                continuation()
+            timer = self.wheel.schedule(when, fire)
+            sequence.timers.add(timer)
+
+    def run_steps(self, sequence, steps, index, done):
+        """Run the steps from an index on, then continue with `done`"""
+        if sequence.cancelled:
+            return
+        if index == len(steps):
+            done()
+            return
+
+        self.run_step(sequence, steps[index], 1, lambda: self.run_steps(sequence, steps, index + 1, done))
+
+    def run_step(self, sequence, step, iteration, done):
+        """Run a single step (one repetition of it), wait and repeat it or continue with `done`"""
+        if sequence.cancelled:
+            return
+        started = self.time
+
+        def repeat_or_continue():
+            when = self.time + step.get('wait', 0)
+            repeat = step.get('repeat', 1)
+            if repeat == 0 or iteration < repeat:
+                # Repetitions are at least a tick apart, so `repeat: 0` without any waiting can't spin
+                self.call_at(sequence, max(when, started + self.tick),
+                             lambda: self.run_step(sequence, step, iteration + 1, done))
+            else:
+                self.call_at(sequence, when, done)
+
+        if 'url' in step:
+            sequence.calls += 1
+            if self.blocking is not None and self.blocking(step):
+                self.perform_blocking(sequence, step, started, repeat_or_continue)
+            else:
+                self.perform(sequence, step)
+                repeat_or_continue()
+        elif 'steps' in step:
+            self.run_steps(sequence, step['steps'], 0, repeat_or_continue)
+        else:
+            branches = step['parallel']
+            remaining = [len(branches)]
+
+            def branch_done():
+                # The slowest branch decides when the step is done
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    repeat_or_continue()
+
+            if not branches:
+                repeat_or_continue()
+            for branch in branches:
+                self.call_at(sequence, self.time, lambda branch=branch: self.run_step(sequence, branch, 1, branch_done))
+
+    def perform(self, sequence, step):
+        """Perform the API call of a step"""
+        try:
+            self.execute(step)
+        except Exception:
+            log.exception('Step of sequence %s failed: %s %s', sequence.id, step['method'], step['url'])
+
+    def perform_blocking(self, sequence, step, due, done):
+        """Perform the API call of a step in a worker thread, then continue with `done` (as if at `due`)"""
+        def performed(future):
+            with self.lock:
+                self.ready.append((due, done))
+            self.e.set()
+
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.workers)
+        self.executor.submit(self.perform, sequence, step).add_done_callback(performed)
+
+    def run_due(self, now=None):
+        """Run the continuations that are due, returns whether any continuations are left"""
+        now = self.clock() if now is None else now
+        while True:
+            with self.lock:
+                if not self.ready:
+                    for callback in self.wheel.advance(now):
+                        self.ready.append((self.wheel.tick_time(self.wheel.current), callback))
+                if not self.ready:
+                    return self.wheel.pending > 0
+                self.time, continuation = self.ready.popleft()
+            continuation()
+
+    def run(self):
+        """Run the scheduler in the current thread"""
+        while self.running:
+            self.e.clear()
+            if self.run_due():
+                # Sleep until the next tick (or a new sequence)
+                self.e.wait(max(0, self.wheel.tick_time(self.wheel.current + 1) - self.clock()))
+            else:
+                self.e.wait()
+
+    async def run_async(self):
+        """Run the scheduler as a task of the event loop"""
+        while self.running:
+            self.run_due()
+            await asyncio.sleep(self.tick)
+
+    def stop(self):
+        self.running = False
+        self.e.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
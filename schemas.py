@@ -1,6 +1,10 @@
 #!/usr/bin/env python
-from marshmallow import Schema, fields
-from marshmallow.validate import OneOf
+from marshmallow import Schema, fields, validates_schema, ValidationError
+from marshmallow.validate import OneOf, Range
+
+SENSOR_ADDRESSES = ['in1', 'in2', 'in3', 'in4']
+
+SENSOR_VALUES = ['is_pressed', 'distance_centimeters', 'proximity', 'rate', 'angle', 'color']
 
 
 class MovementSchema(Schema):
@@ -28,9 +32,32 @@ class SensorSchema(Schema):
 
 
 class ConditionSchema(Schema):
-    comparison = fields.Str(validate=OneOf(['==', '!=', '>', '<', '>=', '<=', 'between']), required=True)
-    compare_with = fields.Int(required=True)
+    # Either a comparison of a sensor value (by default the value of the action's address)...
+    comparison = fields.Str(validate=OneOf(['==', '!=', '>', '<', '>=', '<=', 'between']), required=False)
+    compare_with = fields.Int(required=False)
     compare_with2 = fields.Int(required=False)
+    address = fields.Str(validate=OneOf(SENSOR_ADDRESSES), required=False)
+    action = fields.Str(validate=OneOf(SENSOR_VALUES), required=False)
+
+    # ... or a combination of conditions
+    operator = fields.Str(validate=OneOf(['and', 'or', 'not']), required=False)
+    conditions = fields.Nested('self', many=True, required=False)
+
+    @validates_schema
+    def validate_condition(self, data):
+        if 'operator' in data:
+            if not data.get('conditions'):
+                raise ValidationError('An operator needs conditions', 'conditions')
+            if data['operator'] == 'not' and len(data['conditions']) != 1:
+                raise ValidationError('The not operator takes a single condition', 'conditions')
+            return
+
+        if 'comparison' not in data or 'compare_with' not in data:
+            raise ValidationError('A condition needs a comparison and compare_with (or an operator)')
+        if data['comparison'] == 'between' and 'compare_with2' not in data:
+            raise ValidationError('The between comparison needs compare_with2', 'compare_with2')
+        if ('address' in data) != ('action' in data):
+            raise ValidationError('Comparing another sensor needs both its address and action')
 
 
 class ApiCall(Schema):
@@ -40,19 +67,33 @@ class ApiCall(Schema):
     wait = fields.Int(required=False)
 
 
+class StepSchema(ApiCall):
+    # Either an API call...
+    method = fields.Str(validate=OneOf(['POST', 'GET', 'DELETE']), required=False)
+    url = fields.Str(required=False)
+
+    # ... or steps running one after another, or branches running at the same time (until the slowest is done)
+    steps = fields.Nested('self', many=True, required=False)
+    parallel = fields.Nested('self', many=True, required=False)
+
+    # Seconds to wait after the step, and the number of times to run it (0 repeats until cancelled)
+    wait = fields.Float(validate=Range(min=0), required=False)
+    repeat = fields.Int(validate=Range(min=0), required=False)
+
+    @validates_schema
+    def validate_step(self, data):
+        if sum(key in data for key in ('url', 'steps', 'parallel')) != 1:
+            raise ValidationError('A step needs exactly one of url, steps or parallel')
+        if 'url' in data and 'method' not in data:
+            raise ValidationError('An API call needs a method', 'method')
+
+
 class ActionSchema(Schema):
-    address = fields.Str(validate=OneOf(['in1', 'in2', 'in3', 'in4']), required=True)
-    action = fields.Str(validate=OneOf([
-        'is_pressed',
-        'distance_centimeters',
-        'proximity',
-        'rate',
-        'angle',
-        'color'
-    ]), required=True)
+    address = fields.Str(validate=OneOf(SENSOR_ADDRESSES), required=True)
+    action = fields.Str(validate=OneOf(SENSOR_VALUES), required=True)
     condition = fields.Nested(ConditionSchema, required=True)
-    when_true = fields.Nested(ApiCall, many=True, required=True)
-    when_false = fields.Nested(ApiCall, many=True, required=True)
+    when_true = fields.Nested(StepSchema, many=True, required=True)
+    when_false = fields.Nested(StepSchema, many=True, required=True)
 
 
 class RobotSchema(Schema):
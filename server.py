@@ -2,36 +2,72 @@
 
 import os
 import uuid
+import wave
+import atexit
 import time
+import asyncio
 import logging
+import socket
+import subprocess
+import argparse
 
 import hug
 import json
 import threading
 import ev3dev.ev3 as ev3
 
-from PIL import Image
 from hug.api import INTRO
-from falcon import HTTP_400, HTTP_200
-from wsgiref.simple_server import make_server
+from falcon import HTTP_400, HTTP_200, HTTP_304
+from socketserver import ThreadingMixIn
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler, ServerHandler
 from marshmallow import fields
 from marshmallow.validate import Range, OneOf, ContainsOnly, Length
 
 from client import Client
-from schemas import SensorSchema, RobotSchema, ActionSchema, MovementSideSchema, MotorSchema
+from logs import LEVELS, setup_logging
+from profiler import SamplingProfiler
+from rules import RuleIndex
+from scheduler import Scheduler
+from sampler import DeviceSampler, MOTOR_FIELDS, SENSOR_FIELDS, select_fields
+from runtime import WSGIServer as AsyncWSGIServer
+from teleop import OPCODE_TEXT, OPCODE_BINARY, OPCODE_CLOSE, OPCODE_PING, OPCODE_PONG, DEADMAN_TIMEOUT, \
+    IDLE_TIMEOUT as TELEOP_IDLE_TIMEOUT, direction_speeds, handshake_response, encode_frame, read_frame, \
+    read_frame_async, parse_setpoint
+from sound import SoundCache, Mixer, AplaySink, open_sink, synthesize
+from static import StaticCache
+from schemas import SensorSchema, RobotSchema, ActionSchema, MovementSideSchema, MotorSchema, StepSchema
 
 """
 Global variables
 """
-# Create logger
-logging.basicConfig(level=logging.INFO)
-log = logging.getLogger(__name__)
+# Create loggers, one per subsystem (logging itself is set up by `setup_logging`)
+log = logging.getLogger('server')
+access_log = logging.getLogger('access')
+action_log = logging.getLogger('actions')
+teleop_log = logging.getLogger('teleop')
+log_subsystems = ('server', 'access', 'actions', 'teleop')
 
 # Define port number to serve on
 port_number = 80
 
-# Is kill switch initiated?
-kill_switch = False
+# Time at which the server process started (used to report the startup time)
+start_time = time.time()
+
+# Are the configured devices probed?
+devices_ready = threading.Event()
+
+# Generation of every config section, bumped each time a section changes
+config_generations = {section: 0 for section in ('movement', 'motors', 'sensors', 'actions', 'images', 'sounds')}
+
+# Serialized config sections, keyed by section (`None` for the whole config)
+serialized_config = {}
+
+# Serializes the writers of the config, readers never lock (see `update_config`)
+config_lock = threading.Lock()
+
+# Sampling profiler (only set while profiling)
+profiler = None
 
 """
 Threading
@@ -46,13 +82,19 @@ class MovementControl(threading.Thread):
         self.running = True
         self.speed_left = 0
         self.speed_right = 0
+        self.deadline = None
         self.e = threading.Event()
         threading.Thread.__init__(self)
 
     def run(self):
         while self.running:
-            # Block until the internal flag is true.
-            self.e.wait()
+            # Block until the internal flag is true (or the dead-man deadline has passed).
+            timeout = None if self.deadline is None else max(0, self.deadline - time.time())
+            if not self.e.wait(timeout):
+                # No new speeds in time, stop moving
+                self.deadline = None
+                self.speed_left = 0
+                self.speed_right = 0
             for side, motor in self.motors.items():
                 if not motor.connected:
                     continue
@@ -70,9 +112,11 @@ class MovementControl(threading.Thread):
             motor.stop()
         self.e.set()
 
-    def set_speed(self, speed_left, speed_right):
+    def set_speed(self, speed_left, speed_right, deadline=None):
+        """Set the speeds, when a deadline is given the motors stop unless new speeds are set before it"""
         self.speed_left = speed_left
         self.speed_right = speed_right
+        self.deadline = deadline
         self.e.set()
 
     def update_motors(self, movement_dict):
@@ -86,133 +130,34 @@ class SensorControl(threading.Thread):
     def __init__(self, sensors_dict, actions):
         self.sensors = sensors_dict
         self.actions = actions
-        self.current_actions = {}
+        self.rules = RuleIndex(actions)
         self.running = True
         threading.Thread.__init__(self)
 
     def run(self):
         while self.running:
-            for action in self.actions:
-                address = action['address']
+            # Work on the current snapshots, they are replaced (never modified) on updates
+            sensors = self.sensors
+            rules = self.rules
+            if rules.actions is not self.actions:
+                # Rebuilt by this loop (not the request), so the outcomes it takes over can't change meanwhile
+                rules = self.rules = RuleIndex(self.actions, rules)
 
-                if address not in self.sensors or not self.sensors[address].connected:
-                    continue
-
-                sensor = self.sensors[address]
-
-                value_key = action['action']
-                if value_key == 'is_pressed' and isinstance(sensor, ev3.TouchSensor):
-                    value = sensor.is_pressed
-                elif value_key == 'distance_centimeters' and isinstance(sensor, ev3.UltrasonicSensor):
-                    value = sensor.distance_centimeters
-                elif value_key == 'proximity' and isinstance(sensor, ev3.InfraredSensor):
-                    value = sensor.proximity
-                elif value_key == 'rate' and isinstance(sensor, ev3.GyroSensor):
-                    value = sensor.rate
-                elif value_key == 'angle' and isinstance(sensor, ev3.GyroSensor):
-                    value = sensor.angle
-                elif value_key == 'color' and isinstance(sensor, ev3.ColorSensor):
-                    value = sensor.color
-                else:
-                    continue
-
-                exec_actions = self.current_actions[address] if address in self.current_actions else []
-                comparison = action['condition']['comparison']
-                compare_with = action['condition']['compare_with']
-                when_true = action['when_true']
-                when_false = action['when_false']
-
-                if comparison == '==':
-                    if value == compare_with:
-                        exec_actions = when_true
-                    else:
-                        exec_actions = when_false
-                elif comparison == '!=':
-                    if value != compare_with:
-                        exec_actions = when_true
-                    else:
-                        exec_actions = when_false
-                elif comparison == '>':
-                    if value > compare_with:
-                        exec_actions = when_true
-                    else:
-                        exec_actions = when_false
-                elif comparison == '<':
-                    if value < compare_with:
-                        exec_actions = when_true
-                    else:
-                        exec_actions = when_false
-                elif comparison == '>=':
-                    if value >= compare_with:
-                        exec_actions = when_true
-                    else:
-                        exec_actions = when_false
-                elif comparison == '<=':
-                    if value <= compare_with:
-                        exec_actions = when_true
-                    else:
-                        exec_actions = when_false
-                elif comparison == 'between':
-                    compare_with2 = action['condition']['compare_with2']
-                    # Interval comparison (same as `value >= compare_with and value <= compare_with2`):
-                    if compare_with <= value <= compare_with2:
-                        exec_actions = when_true
-                    else:
-                        exec_actions = when_false
-
-                # Do the action once
-                if address in self.current_actions and self.current_actions[address] == exec_actions:
-                    continue
-
-                execute_action = ExecuteAction(exec_actions)
-                execute_action.start()
-
-                self.current_actions[address] = exec_actions
+            # Only the actions depending on a changed value are evaluated
+            rules.start(read_ports(sensors, rules.ports), scheduler)
 
     def update_sensors(self, sensors_dict):
         """Update the sensors"""
         self.sensors = sensors_dict
 
     def update_actions(self, actions):
-        """Update actions"""
+        """Update actions, unchanged actions aren't done again"""
         self.actions = actions
 
     def stop(self):
         self.running = False
 
 
-class ExecuteAction(threading.Thread):
-    """Simple thread dealing with the execution of actions"""
-
-    def __init__(self, exec_actions):
-        self.exec_actions = exec_actions
-        threading.Thread.__init__(self)
-
-    def run(self):
-        for action in self.exec_actions:
-            global kill_switch  # Needed to modify global copy of kill_switch
-            if kill_switch:
-                kill_switch = False
-                break
-
-            if action['method'] == 'POST':
-                body = ''
-                if 'body' in action:
-                    body = action['body']
-                result = client.post(action['url'], body)
-            elif action['method'] == 'GET':
-                result = client.get(action['url'])
-            # if action['method'] == 'DELETE':
-            else:
-                result = client.delete(action['url'])
-
-            # Should we wait before performing another action?
-            if 'wait' in action:
-                time.sleep(action['wait'])
-
-            log.info('Action successfully executed.\nAction: %s\nResult: %s' % (json.dumps(action), result.data))
-
-
 class ScreenControl(threading.Thread):
     """Simple thread dealing with the screen of the brick"""
 
@@ -252,6 +197,159 @@ class ScreenControl(threading.Thread):
         self.running = False
 
 
+class DeviceProbe(threading.Thread):
+    """Simple thread probing the configured devices in the background"""
+
+    def __init__(self):
+        self.duration = None
+        threading.Thread.__init__(self)
+
+    def run(self):
+        start = time.time()
+
+        # Probe the devices of the config that was active when we started
+        current_config = config
+        probe_devices(current_config['motors'], current_config['sensors'], current_config['movement'])
+
+        self.duration = time.time() - start
+        devices_ready.set()
+
+        log.info('Devices probed in %.2f seconds', self.duration)
+
+
+"""
+Asyncio runtime
+"""
+
+
+class AsyncMovementControl:
+    """Task dealing with driving motors, the asyncio counterpart of `MovementControl`"""
+
+    def __init__(self, movement_dict):
+        self.motors = movement_dict
+        self.running = True
+        self.speed_left = 0
+        self.speed_right = 0
+        self.deadline = None
+        self.e = asyncio.Event()
+
+    async def run(self):
+        while self.running:
+            # Wait until new speeds are set (or the dead-man deadline has passed),
+            # speeds set in the meantime are coalesced.
+            timeout = None if self.deadline is None else max(0, self.deadline - time.time())
+            try:
+                await asyncio.wait_for(self.e.wait(), timeout)
+            except asyncio.TimeoutError:
+                # No new speeds in time, stop moving
+                self.deadline = None
+                self.speed_left = 0
+                self.speed_right = 0
+            self.e.clear()
+            for side, motor in self.motors.items():
+                if not motor.connected:
+                    continue
+
+                if side == 'left':
+                    motor.run_direct(duty_cycle_sp=self.speed_left)
+                elif side == 'right':
+                    motor.run_direct(duty_cycle_sp=self.speed_right)
+
+    def stop(self):
+        self.running = False
+        for side, motor in self.motors.items():
+            motor.stop()
+        self.e.set()
+
+    def set_speed(self, speed_left, speed_right, deadline=None):
+        """Set the speeds, when a deadline is given the motors stop unless new speeds are set before it"""
+        self.speed_left = speed_left
+        self.speed_right = speed_right
+        self.deadline = deadline
+        self.e.set()
+
+    def update_motors(self, movement_dict):
+        """Update the motors"""
+        self.motors = movement_dict
+
+
+class AsyncSensorControl:
+    """Task dealing with sensor control, the asyncio counterpart of `SensorControl`"""
+
+    def __init__(self, sensors_dict, actions, interval=0.01):
+        self.sensors = sensors_dict
+        self.actions = actions
+        self.rules = RuleIndex(actions)
+        self.interval = interval
+        self.running = True
+
+    async def run(self):
+        while self.running:
+            # Work on the current snapshots, they are replaced (never modified) on updates
+            sensors = self.sensors
+            rules = self.rules
+            if rules.actions is not self.actions:
+                # Rebuilt by this loop (not the request), so the outcomes it takes over can't change meanwhile
+                rules = self.rules = RuleIndex(self.actions, rules)
+
+            # Only the actions depending on a changed value are evaluated
+            rules.start(read_ports(sensors, rules.ports), scheduler)
+
+            # Give the other tasks a chance to run
+            await asyncio.sleep(self.interval)
+
+    def update_sensors(self, sensors_dict):
+        """Update the sensors"""
+        self.sensors = sensors_dict
+
+    def update_actions(self, actions):
+        """Update actions, unchanged actions aren't done again"""
+        self.actions = actions
+
+    def stop(self):
+        self.running = False
+
+
+class AsyncScreenControl:
+    """Task dealing with the screen of the brick, the asyncio counterpart of `ScreenControl`"""
+
+    def __init__(self):
+        self.image = None
+        self.timeout = -1
+        self.screen = None
+        self.running = True
+        self.e = asyncio.Event()
+
+    async def run(self):
+        while self.running:
+            # Wait until there is something to display.
+            await self.e.wait()
+            self.e.clear()
+
+            self.screen.image.paste(self.image, (0, 0))
+            self.screen.update()
+
+            if self.timeout == 0:
+                continue
+
+            # Clear the screen after the timeout, unless something else is displayed in the meantime
+            try:
+                await asyncio.wait_for(self.e.wait(), max(0, self.timeout - time.time()))
+            except asyncio.TimeoutError:
+                self.screen.clear()
+                self.screen.update()
+
+    def display(self, pil_image, timeout):
+        """Display a bitmap on the brick's display for an amount of time"""
+        self.screen = ev3.Screen()
+        self.image = pil_image
+        self.timeout = timeout
+        self.e.set()
+
+    def stop(self):
+        self.running = False
+
+
 """
 Helpers
 """
@@ -271,6 +369,181 @@ def save_json(filename, data):
     return data
 
 
+def freeze_config(data):
+    """Get a config snapshot, its lists become tuples so they can't be modified in place"""
+    snapshot = dict(data)
+    for section in ('actions', 'images', 'sounds'):
+        snapshot[section] = tuple(snapshot[section])
+    return snapshot
+
+
+def update_config(**sections):
+    """
+    Publish a new config snapshot with the given sections replaced, and save it.
+    The config is never modified in place, so readers can use it without locking.
+    Writers should hold `config_lock` while reading and updating the config.
+    """
+    global config  # Needed to modify global copy of config
+    config = freeze_config(dict(config, **sections))
+
+    save_config(*sections)
+
+
+def save_config(*sections):
+    """Save the config and bump the generation of the changed sections (all sections if none given)"""
+    for section in sections or config_generations:
+        config_generations[section] += 1
+
+    save_json('config.json', config)
+
+
+def config_etag(section=None):
+    """Get the entity tag of a config section (or the whole config)"""
+    sections = [section] if section is not None else sorted(config_generations)
+
+    # Prefixed with the start time, the generations start from zero again after a restart
+    return '"%x-%s"' % (int(start_time), '-'.join(str(config_generations[name]) for name in sections))
+
+
+def get_cached_config(section, request, response):
+    """Serialize a config section once per generation and answer conditional requests"""
+    etag = config_etag(section)
+    response.set_header('ETag', etag)
+    response.set_header('Cache-Control', 'no-cache')
+
+    if request.get_header('If-None-Match') == etag:
+        response.status = HTTP_304
+        return b''
+
+    cached = serialized_config.get(section)
+    if cached is None or cached[0] != etag:
+        data = config if section is None else config[section]
+        cached = (etag, hug.output_format.json(data))
+        serialized_config[section] = cached
+    return cached[1]
+
+
+@hug.format.content_type('application/json')
+def cached_json(content, request=None, response=None):
+    """JSON output format that passes already serialized content through"""
+    if isinstance(content, bytes):
+        return content
+    return hug.output_format.json(content, request, response)
+
+
+def speak(text):
+    """Speak text through the mixer, so it doesn't contend with the mixer for the speaker"""
+    try:
+        mixer.play(synthesize(text))
+    except (OSError, EOFError, wave.Error, subprocess.CalledProcessError) as e:
+        log.error('Text could not be spoken: %r', e)
+
+
+def preload_sounds():
+    """Decode the sounds of the config before they are played"""
+    sound_cache.preload(config['sounds'])
+
+
+def read_sensor_value(sensor, value_key):
+    """Read the value an action is interested in, `None` if the sensor doesn't provide it"""
+    if value_key == 'is_pressed' and isinstance(sensor, ev3.TouchSensor):
+        return sensor.is_pressed
+    elif value_key == 'distance_centimeters' and isinstance(sensor, ev3.UltrasonicSensor):
+        return sensor.distance_centimeters
+    elif value_key == 'proximity' and isinstance(sensor, ev3.InfraredSensor):
+        return sensor.proximity
+    elif value_key == 'rate' and isinstance(sensor, ev3.GyroSensor):
+        return sensor.rate
+    elif value_key == 'angle' and isinstance(sensor, ev3.GyroSensor):
+        return sensor.angle
+    elif value_key == 'color' and isinstance(sensor, ev3.ColorSensor):
+        return sensor.color
+    return None
+
+
+def read_ports(sensors, ports):
+    """Read the value of every `(address, value_key)` port, `None` for a port without a connected sensor"""
+    values = {}
+    for address, value_key in ports:
+        sensor = sensors.get(address)
+        values[address, value_key] = read_sensor_value(sensor, value_key) \
+            if sensor is not None and sensor.connected else None
+    return values
+
+
+def execute_step(step):
+    """Perform the API call of a step of an action sequence (on behalf of the scheduler)"""
+    result = perform_api_call(step)
+    action_log.info('Action successfully executed: %s %s', step['method'], step['url'],
+                    extra={'action': step, 'result': result.data})
+
+
+def probes_devices(step):
+    """Does the API call of a step probe devices (and block for as long as that takes)?"""
+    return (step['method'], step['url'].split('?', 1)[0].rstrip('/')) in probing_routes
+
+
+def perform_api_call(action):
+    """Perform the API call of an action step"""
+    if action['method'] == 'POST':
+        body = ''
+        if 'body' in action:
+            body = action['body']
+        return client.post(action['url'], body)
+    elif action['method'] == 'GET':
+        return client.get(action['url'])
+    # if action['method'] == 'DELETE':
+    return client.delete(action['url'])
+
+
+def handle_teleop_frame(opcode, payload):
+    """Handle a frame of the teleop channel, returns the frame to reply with (if any) and whether it's closed"""
+    if opcode == OPCODE_CLOSE:
+        return encode_frame(OPCODE_CLOSE, payload[:2]), True
+    elif opcode == OPCODE_PING:
+        return encode_frame(OPCODE_PONG, payload), False
+    elif opcode in (OPCODE_TEXT, OPCODE_BINARY):
+        try:
+            setpoint = parse_setpoint(opcode, payload)
+        except (ValueError, KeyError, TypeError) as e:
+            teleop_log.error('Invalid teleop setpoint: %r', e)
+            return None, False
+        if setpoint is None:
+            # Keepalive, leaves the motors (and their dead-man deadline) alone
+            return None, False
+
+        speed_left, speed_right = setpoint
+        # The motors stop when the next setpoint doesn't arrive in time
+        movement_control.set_speed(speed_left, speed_right, time.time() + DEADMAN_TIMEOUT)
+    return None, False
+
+
+async def serve_teleop_async(reader, writer, environ):
+    """Serve the teleop WebSocket over an asyncio connection"""
+    key = environ.get('HTTP_SEC_WEBSOCKET_KEY')
+    if not key:
+        writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+        return
+
+    writer.write(handshake_response(key))
+    teleop_log.info('Teleop session of %s started', environ['REMOTE_ADDR'])
+    try:
+        while True:
+            frame = await asyncio.wait_for(read_frame_async(reader), TELEOP_IDLE_TIMEOUT)
+            reply, closed = handle_teleop_frame(*frame)
+            if reply:
+                writer.write(reply)
+                await writer.drain()
+            if closed:
+                break
+    except (OSError, EOFError, ValueError, asyncio.TimeoutError) as e:
+        teleop_log.error('Teleop session of %s failed: %r', environ['REMOTE_ADDR'], e)
+    finally:
+        # Losing the operator is the same as releasing the dead-man switch
+        movement_control.set_speed(0, 0)
+        teleop_log.info('Teleop session of %s ended', environ['REMOTE_ADDR'])
+
+
 def parse_sensor_config(sensor_config):
     """Parse the sensor config and assign them to a specific sensor class"""
     data = {}
@@ -361,28 +634,104 @@ def parse_movement_config(movement_config):
     return data
 
 
+def probe_devices(motor_config=None, sensor_config=None, movement_config=None):
+    """
+    Probe the devices of the given config sections, then publish them. Probing takes
+    seconds, so it's done without holding `config_lock`; a section that was redefined
+    in the meantime keeps the devices its own writer publishes.
+    """
+    probed_motors = parse_motor_config(motor_config) if motor_config is not None else None
+    probed_sensors = parse_sensor_config(sensor_config) if sensor_config is not None else None
+    probed_movement = parse_movement_config(movement_config) if movement_config is not None else None
+
+    # A writer can't redefine a section between the check and the assignment while we hold the lock
+    global motors, sensors, movement  # Needed to modify global copies of the devices
+    with config_lock:
+        if motor_config is not None and config['motors'] is motor_config:
+            motors = probed_motors
+        if sensor_config is not None and config['sensors'] is sensor_config:
+            sensors = probed_sensors
+            sensor_control.update_sensors(sensors)
+        if movement_config is not None and config['movement'] is movement_config:
+            movement = probed_movement
+            movement_control.update_motors(movement)
+
+
 """
 Main config
 """
 
-config = read_json('config.json')
-motors = parse_motor_config(config['motors'])
-sensors = parse_sensor_config(config['sensors'])
-movement = parse_movement_config(config['movement'])
+config = freeze_config(read_json('config.json'))
+
+# Static files of the webapp and the API docs (compressed by the preloader, served as is until then)
+webapp_files = StaticCache(os.path.join(os.getcwd(), 'webapp'))
+docs_files = StaticCache(os.path.join(os.getcwd(), 'docs'))
+
+# Decoded sounds and the mixer playing them (both filled on demand or by the preloader)
+sound_cache = SoundCache()
+mixer = Mixer(AplaySink())
+
+# Routes probing the devices they define, these block for as long as probing takes
+probing_routes = (('POST', '/api/config'), ('POST', '/api/motor/config'), ('POST', '/api/movement/config'),
+                  ('POST', '/api/sensor/config'))
+
+# Runs the action sequences (from `run_threads` or `run_asyncio`), steps probing devices run in worker threads
+scheduler = Scheduler(execute_step, blocking=probes_devices)
+
+# Snapshots of all motors and sensors, shared by the requests asking for them
+device_sampler = DeviceSampler()
+
+# The devices are probed in the background by `DeviceProbe` once the server is listening
+motors = {}
+sensors = {}
+movement = {}
+
+# Probes the configured devices (only set once `run_threads` or `run_asyncio` started it)
+device_probe = None
 
 """
 Hug routes
 """
 
 
-@hug.static('/')
-def webapp():
-    return os.path.join(os.getcwd(), 'webapp'),
+@hug.format.content_type('application/octet-stream')
+def static_content(content, request=None, response=None):
+    """Output format that passes already encoded static content through"""
+    return content
+
+
+def serve_static(static_cache, path, request, response):
+    """Serve a file from the static cache, negotiating the content encoding"""
+    static_file = static_cache.get(path)
+    if static_file is None:
+        hug.redirect.not_found()
+
+    encoding = static_file.negotiate(request.get_header('Accept-Encoding'))
+    etag = static_file.etags[encoding]
+
+    response.content_type = static_file.content_type
+    response.set_header('ETag', etag)
+    response.set_header('Last-Modified', static_file.last_modified)
+    response.set_header('Cache-Control', 'public, max-age=%d' % static_cache.max_age)
+    response.set_header('Vary', 'Accept-Encoding')
+
+    if request.get_header('If-None-Match') == etag:
+        response.status = HTTP_304
+        return b''
+
+    if encoding != 'identity':
+        response.set_header('Content-Encoding', encoding)
+    return static_file.encodings[encoding]
+
 
+@hug.sink('/', output=static_content)
+def webapp(request, response, path=''):
+    return serve_static(webapp_files, path, request, response)
 
-@hug.static('/api')
-def swagger_api():
-    return os.path.join(os.getcwd(), 'docs'),
+
+@hug.sink('/api', output=static_content)
+def swagger_api(request, response, path=''):
+    return serve_static(docs_files, path, request, response)
 
 
 @hug.not_found()
@@ -390,134 +739,119 @@ def not_found():
     return {'message': '404 Not Found', 'code': 404}
 
 
+@hug.get('/api/ready')
+def get_ready():
+    """Are the configured devices probed and ready to use?"""
+    duration = device_probe.duration if device_probe is not None else None
+    return {
+        'ready': devices_ready.is_set(),
+        'uptime': round(time.time() - start_time, 3),
+        'probe_duration': round(duration, 3) if duration is not None else None
+    }
+
+
 @hug.post('/api/config')
 def set_config(body: fields.Nested(RobotSchema)):
     """Set config"""
-    global config  # Needed to modify global copy of config
-    config = body
-
-    # Save config
-    save_json('config.json', config)
-
-    global motors  # Needed to modify global copy of motors
-    motors = parse_motor_config(config['motors'])
-
-    global sensors  # Needed to modify global copy of sensors
-    sensors = parse_sensor_config(config['sensors'])
+    with config_lock:
+        update_config(**body)
+        new_config = config
 
-    global movement  # Needed to modify global copy of movement
-    movement = parse_movement_config(config['movement'])
-
-    movement_control.update_motors(movement)
-    sensor_control.update_sensors(sensors)
+    probe_devices(new_config['motors'], new_config['sensors'], new_config['movement'])
     sensor_control.update_actions(config['actions'])
 
     return {'message': 'Config successfully set', 'code': 200}
 
 
-@hug.get('/api/config')
-def get_config():
+@hug.get('/api/config', output=cached_json)
+def get_config(request, response):
     """Set config"""
-    return config
+    return get_cached_config(None, request, response)
 
 
 @hug.post('/api/motor/config/')
 def set_motor_config(body: fields.Nested(MotorSchema)):
     """Create a list of motors to control"""
-    config['motors'] = body
-
-    # Save config
-    save_json('config.json', config)
-
-    global motors  # Needed to modify global copy of motors
-    motors = parse_motor_config(config['motors'])
+    with config_lock:
+        update_config(motors=body)
+        motor_config = config['motors']
 
-    movement_control.update_motors(motors)
+    probe_devices(motor_config=motor_config)
 
     return {'message': 'Motors successfully defined', 'code': 200}
 
 
-@hug.get('/api/motor/config/')
-def get_motor_config():
+@hug.get('/api/motor/config/', output=cached_json)
+def get_motor_config(request, response):
     """Get a list of motors"""
-    return config['motors']
+    return get_cached_config('motors', request, response)
 
 
 @hug.post('/api/movement/config/')
 def set_movement_config(body: fields.Nested(MovementSideSchema)):
     """Defines the motor address and type of a side"""
-    config['movement'] = body
+    with config_lock:
+        update_config(movement=body)
+        movement_config = config['movement']
 
-    # Save config
-    save_json('config.json', config)
-
-    global movement  # Needed to modify global copy of movement
-    movement = parse_movement_config(config['movement'])
-
-    movement_control.update_motors(movement)
+    probe_devices(movement_config=movement_config)
 
     return {'message': 'Movement motors successfully defined', 'code': 200}
 
 
-@hug.get('/api/movement/config/')
-def get_movement_config():
+@hug.get('/api/movement/config/', output=cached_json)
+def get_movement_config(request, response):
     """Get movement config"""
-    return config['movement']
+    return get_cached_config('movement', request, response)
 
 
 @hug.post('/api/sensor/config')
 def set_sensor_config(body: fields.Nested(SensorSchema)):
     """Create a list of sensors to get values from"""
-    config['sensors'] = body
+    with config_lock:
+        update_config(sensors=body)
+        sensor_config = config['sensors']
 
-    # Save config
-    save_json('config.json', config)
-
-    global sensors  # Needed to modify global copy of sensors
-    sensors = parse_sensor_config(config['sensors'])
-
-    sensor_control.update_sensors(sensors)
+    probe_devices(sensor_config=sensor_config)
 
     return {'message': 'Sensors successfully defined', 'code': 200}
 
 
-@hug.get('/api/sensor/config')
-def get_sensor_config():
+@hug.get('/api/sensor/config', output=cached_json)
+def get_sensor_config(request, response):
     """Get a list of sensors"""
-    return config['sensors']
+    return get_cached_config('sensors', request, response)
 
 
 @hug.post('/api/action/config')
 def set_actions(body: fields.Nested(ActionSchema, many=True)):
     """Create a list of actions"""
-    config['actions'] = body
-
-    # Save config
-    save_json('config.json', config)
+    with config_lock:
+        update_config(actions=body)
 
     sensor_control.update_actions(config['actions'])
 
     return {'action_ids': range(len(config['actions']))}
 
 
-@hug.get('/api/action/config')
-def get_actions():
+@hug.get('/api/action/config', output=cached_json)
+def get_actions(request, response):
     """Get actions config"""
-    return config['actions']
+    return get_cached_config('actions', request, response)
 
 
 @hug.post('/api/motor/killswitch')
 def set_kill_switch(response):
-    """Shut off all motors"""
+    """Shut off all motors and cancel all action sequences"""
     # Shut off movement motors
     movement_control.set_speed(0, 0)
 
     # Shut off other motors
-    for address in motors:
-        motors[address].stop()
+    for motor in motors.values():
+        motor.stop()
 
-    global kill_switch  # Needed to modify global copy of kill_switch
-    kill_switch = True
+    # Stop all action sequences
+    scheduler.cancel_all()
 
     response.status = HTTP_200
     return {'message': 'All motors successfully stopped', 'code': 200}
@@ -529,9 +863,10 @@ def start_motor(address: fields.Str(validate=[Length(min=1), ContainsOnly(['A',
                 response):
     """Starts or stops one or several motor(s)"""
     result = {'messages': [], 'code': 200}
+    current_motors = motors
     for single_address in address:
         single_address = 'out' + single_address
-        if single_address not in motors:
+        if single_address not in current_motors:
             error = 'Motor (address %s) is not defined yet' % single_address
 
             # Append the error to the existing array
@@ -543,7 +878,7 @@ def start_motor(address: fields.Str(validate=[Length(min=1), ContainsOnly(['A',
             result['code'] = 400
             continue
 
-        motor = motors[single_address]
+        motor = current_motors[single_address]
 
         if not motor.connected:
             error = '%s is not connected' % motor
@@ -571,9 +906,8 @@ def get_motor_status(address: fields.Str(validate=OneOf(['outA', 'outB', 'outC',
     Get the current state and duty_cycle of a motor. Possible states are
     `running`, `ramping`, `holding`, `overloaded` and `stalled`.
     """
-    if address in motors:
-        motor = motors[address]
-    else:
+    motor = motors.get(address)
+    if motor is None:
         # Motor not defined, just get the value from it
         motor = ev3.Motor(address)
 
@@ -589,51 +923,60 @@ def get_motor_status(address: fields.Str(validate=OneOf(['outA', 'outB', 'outC',
 def delete_motor(address: fields.Str(validate=OneOf(['outA', 'outB', 'outC', 'outD'])),
                  response):
     """Delete the motor by a specific address"""
-    if address in motors:
-        motor = motors[address]
+    with config_lock:
+        global motors  # Needed to modify global copy of motors
+        if address not in motors:
+            response.status = HTTP_400
+            return {'message': 'Motor address unknown', 'code': 400}
 
         # Stop the motor before deleting
-        motor.stop()
+        motors[address].stop()
 
         # Delete from motors dict
-        del motors[address]
+        motors = {key: motor for key, motor in motors.items() if key != address}
 
         # Delete from config
-        del config['motors'][address]
+        update_config(motors={key: value for key, value in config['motors'].items() if key != address})
 
-        # Save config
-        save_json('config.json', config)
-
-        return {'message': 'Specific motor successfully deleted', 'code': 200}
-    else:
-        response.status = HTTP_400
-        return {'message': 'Motor address unknown', 'code': 400}
+    return {'message': 'Specific motor successfully deleted', 'code': 200}
 
 
 @hug.post('/api/movement/{direction}/{speed_percentage}')
 def move_to_direction(direction: fields.Str(validate=OneOf(['forward', 'backward', 'left', 'right'])),
                       speed_percentage: fields.Int(validate=Range(min=0, max=100))):
     """Move robot towards a specific direction"""
-    left_speed = speed_percentage
-    right_speed = speed_percentage
-    if direction == 'forward':
-        left_speed *= -1
-        right_speed *= -1
-    elif direction == 'left':
-        right_speed *= -1
-    elif direction == 'right':
-        left_speed *= -1
+    left_speed, right_speed = direction_speeds(direction, speed_percentage)
     movement_control.set_speed(left_speed, right_speed)
     return {'movement': 'none' if speed_percentage == 0 else direction}
 
 
+@hug.get('/api/devices')
+def get_devices(response, fields: hug.types.delimited_list(',')=None):
+    """
+    Get a timestamped snapshot of every motor and sensor port, at most 0.1 seconds
+    old. Use `fields` to select the fields of the devices (default all).
+    """
+    unknown = [field for field in fields or [] if field not in MOTOR_FIELDS + SENSOR_FIELDS]
+    if unknown:
+        response.status = HTTP_400
+        return {'message': 'Unknown field(s): %s' % ', '.join(unknown), 'code': 400}
+
+    # Movement motors are read through their own objects as well, keyed by the port they were probed on
+    # (not the movement config, which is replaced before the motors while they are probed)
+    all_motors = dict(motors)
+    all_motors.update((motor.kwargs['address'], motor) for motor in movement.values())
+
+    snapshot = device_sampler.get(all_motors, sensors, config['sensors'])
+    return select_fields(snapshot, fields) if fields else snapshot
+
+
 @hug.get('/api/sensor/{address}')
 def get_sensor_value(address: fields.Str(validate=OneOf(['in1', 'in2', 'in3', 'in4'])),
                      response):
     """Get the sensor value from an address"""
-    if address in sensors:
-        sensor = sensors[address]
-        sensor_type = config['sensors'][address]
+    sensor = sensors.get(address)
+    if sensor is not None:
+        sensor_type = config['sensors'].get(address, 'unknown')
     else:
         # Sensor not defined, just get the value from it
         sensor = ev3.Sensor(address)
@@ -651,20 +994,21 @@ def get_sensor_value(address: fields.Str(validate=OneOf(['in1', 'in2', 'in3', 'i
 def delete_sensor(address: fields.Str(validate=OneOf(['in1', 'in2', 'in3', 'in4'])),
                   response):
     """Delete the sensor by a specific address"""
-    if address in sensors:
+    with config_lock:
+        global sensors  # Needed to modify global copy of sensors
+        if address not in sensors:
+            response.status = HTTP_400
+            return {'message': 'Sensor address unknown', 'code': 400}
+
         # Delete from sensors dict
-        del sensors[address]
+        sensors = {key: sensor for key, sensor in sensors.items() if key != address}
 
         # Delete from config
-        del config['sensors'][address]
+        update_config(sensors={key: value for key, value in config['sensors'].items() if key != address})
 
-        # Save config
-        save_json('config.json', config)
+    sensor_control.update_sensors(sensors)
 
-        return {'message': 'Specific sensor successfully deleted', 'code': 200}
-    else:
-        response.status = HTTP_400
-        return {'message': 'Sensor address unknown', 'code': 400}
+    return {'message': 'Specific sensor successfully deleted', 'code': 200}
 
 
 @hug.post('/api/action/{action_id}')
@@ -672,10 +1016,10 @@ def insert_action(action_id: hug.types.number,
                   body: fields.Nested(ActionSchema),
                   response):
     """Insert an action before the given action id"""
-    config['actions'].insert(action_id, body)
-
-    # Save config
-    save_json('config.json', config)
+    with config_lock:
+        actions = list(config['actions'])
+        actions.insert(action_id, body)
+        update_config(actions=actions)
 
     sensor_control.update_actions(config['actions'])
 
@@ -699,10 +1043,10 @@ def remove_action(action_id: hug.types.number,
                   response):
     """Delete action for a specific id"""
     try:
-        del config['actions'][action_id]
-
-        # Save config
-        save_json('config.json', config)
+        with config_lock:
+            actions = list(config['actions'])
+            del actions[action_id]
+            update_config(actions=actions)
 
         sensor_control.update_actions(config['actions'])
 
@@ -716,7 +1060,10 @@ def remove_action(action_id: hug.types.number,
 @hug.post('/api/sound/tts/{text}')
 def speak_text(text):
     """Text to speech"""
-    ev3.Sound.speak(text)
+    # Synthesizing takes a while, so it's done in the background
+    speaker = threading.Thread(target=speak, args=(text,))
+    speaker.setDaemon(True)
+    speaker.start()
     return {'message': 'Text-to-speech successfully executed', 'code': 200}
 
 
@@ -725,12 +1072,16 @@ def play_sound(sound_id: hug.types.number, response):
     """Play a wav file with the specified id"""
     try:
         sound = config['sounds'][sound_id]
-        ev3.Sound.play(sound)
+        mixer.play(sound_cache.get(sound))
         return {'message': 'Sound successfully played', 'code': 200}
     except IndexError:
         log.error('Sound ID out of range')
         response.status = HTTP_400
         return {'message': 'Sound ID out of range', 'code': 400}
+    except (OSError, EOFError, wave.Error) as e:
+        log.error('Sound could not be decoded: %r', e)
+        response.status = HTTP_400
+        return {'message': 'Sound could not be decoded', 'code': 400}
 
 
 @hug.post('/api/sound')
@@ -750,12 +1101,11 @@ def add_sound(body, response):
         with open(file_path, 'wb') as f:
             f.write(file)
 
-        config['sounds'].append(file_path)
+        with config_lock:
+            update_config(sounds=config['sounds'] + (file_path,))
+            sound_id = len(config['sounds']) - 1
 
-        # Save config
-        save_json('config.json', config)
-
-        return {'message': 'Sound successfully saved', 'id': len(config['sounds']) - 1, 'code': 200}
+        return {'message': 'Sound successfully saved', 'id': sound_id, 'code': 200}
     else:
         log.error('No file selected')
         response.status = HTTP_400
@@ -766,10 +1116,10 @@ def add_sound(body, response):
 def delete_sound(sound_id: hug.types.number, response):
     """Delete a specific sound by id"""
     try:
-        del config['sounds'][sound_id]
-
-        # Save config
-        save_json('config.json', config)
+        with config_lock:
+            sounds = list(config['sounds'])
+            del sounds[sound_id]
+            update_config(sounds=sounds)
 
         return {'message': 'Sound successfully deleted', 'code': 200}
     except IndexError:
@@ -781,6 +1131,9 @@ def delete_sound(sound_id: hug.types.number, response):
 @hug.post('/api/image/{image_id}/{time_in_sec}')
 def display_image(image_id: hug.types.number, time_in_sec: hug.types.number, response):
     """Display a bitmap on the brick's display for an amount of time"""
+    # Imported on first use, PIL is expensive to import on the brick
+    from PIL import Image
+
     try:
         img = Image.open(config['images'][image_id])
         timeout = 0 if time_in_sec == 0 else time.time() + time_in_sec
@@ -811,12 +1164,11 @@ def add_image(body, response):
         with open(file_path, 'wb') as f:
             f.write(file)
 
-        config['images'].append(file_path)
-
-        # Save config
-        save_json('config.json', config)
+        with config_lock:
+            update_config(images=config['images'] + (file_path,))
+            image_id = len(config['images']) - 1
 
-        return {'message': 'Image successfully saved', 'id': len(config['images']) - 1, 'code': 200}
+        return {'message': 'Image successfully saved', 'id': image_id, 'code': 200}
     else:
         log.error('No file selected')
         response.status = HTTP_400
@@ -827,10 +1179,10 @@ def add_image(body, response):
 def delete_image(image_id: hug.types.number, response):
     """Delete a specific image by id"""
     try:
-        del config['images'][image_id]
-
-        # Save config
-        save_json('config.json', config)
+        with config_lock:
+            images = list(config['images'])
+            del images[image_id]
+            update_config(images=images)
 
         return {'message': 'Image successfully deleted', 'code': 200}
     except IndexError:
@@ -839,18 +1191,215 @@ def delete_image(image_id: hug.types.number, response):
         return {'message': 'Sound ID out of range', 'code': 400}
 
 
+@hug.post('/api/profiler/start')
+def start_profiler(response,
+                   interval: fields.Float(validate=Range(min=0.001, max=1))=0.01,
+                   max_overhead: fields.Float(validate=Range(min=0.001, max=0.5))=0.05):
+    """Start sampling the call stacks of all threads"""
+    global profiler  # Needed to modify global copy of profiler
+    if profiler is not None and profiler.running:
+        response.status = HTTP_400
+        return {'message': 'Profiler is already running', 'code': 400}
+
+    profiler = SamplingProfiler(interval, max_overhead)
+    profiler.setDaemon(True)
+    profiler.start()
+
+    return {'message': 'Profiler successfully started', 'code': 200}
+
+
+@hug.post('/api/profiler/stop')
+def stop_profiler(response):
+    """Stop sampling the call stacks"""
+    if profiler is None or not profiler.running:
+        response.status = HTTP_400
+        return {'message': 'Profiler is not running', 'code': 400}
+
+    profiler.stop()
+    profiler.join()
+
+    return profiler.stats()
+
+
+@hug.get('/api/profiler')
+def get_profiler_stats(response):
+    """Get a summary of the last (or current) profiling session"""
+    if profiler is None:
+        response.status = HTTP_400
+        return {'message': 'Profiler has not been started yet', 'code': 400}
+
+    return profiler.stats()
+
+
+@hug.get('/api/sequences')
+def get_sequences():
+    """Get the running action sequences"""
+    return {'sequences': scheduler.status()}
+
+
+@hug.post('/api/sequences')
+def start_sequence(body: fields.Nested(StepSchema, many=True)):
+    """Start running a sequence of steps"""
+    sequence_id = scheduler.start(body, 'api')
+    return {'message': 'Sequence successfully started', 'id': sequence_id, 'code': 200}
+
+
+@hug.delete('/api/sequences/{sequence_id}')
+def cancel_sequence(sequence_id, response):
+    """Cancel a running action sequence by id"""
+    if not scheduler.cancel(sequence_id):
+        log.error('Sequence ID unknown')
+        response.status = HTTP_400
+        return {'message': 'Sequence ID unknown', 'code': 400}
+
+    return {'message': 'Sequence successfully cancelled', 'code': 200}
+
+
+@hug.delete('/api/sequences')
+def cancel_sequences():
+    """Cancel all running action sequences (without stopping the motors, see the kill switch)"""
+    return {'message': '%d sequence(s) successfully cancelled' % scheduler.cancel_all(), 'code': 200}
+
+
+@hug.get('/api/logging')
+def get_log_levels():
+    """Get the log level of every subsystem"""
+    return {subsystem: logging.getLevelName(logging.getLogger(subsystem).getEffectiveLevel())
+            for subsystem in log_subsystems}
+
+
+@hug.post('/api/logging/{subsystem}/{level}')
+def set_log_level(subsystem: fields.Str(validate=OneOf(log_subsystems)),
+                  level: fields.Str(validate=OneOf(LEVELS))):
+    """Set the log level of a subsystem"""
+    logging.getLogger(subsystem).setLevel(level)
+
+    return {'message': 'Log level of %s successfully set to %s' % (subsystem, level), 'code': 200}
+
+
+@hug.get('/api/profiler/stacks', output=hug.output_format.text)
+def get_profiler_stacks(response):
+    """Get the aggregated stacks in collapsed-stack format (suitable for flame graphs)"""
+    if profiler is None:
+        response.status = HTTP_400
+        return 'Profiler has not been started yet'
+
+    return profiler.collapsed()
+
+
 """
 Server/client
 """
 
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    """WSGI server handling each connection in its own thread"""
+    daemon_threads = True
+
+
+class KeepAliveServerHandler(ServerHandler):
+    """WSGI handler answering with HTTP/1.1, so the connection can be kept alive"""
+    http_version = '1.1'
+
+    def send_preamble(self):
+        # Without a length, the end of the response is the end of the connection
+        if 'Content-Length' not in self.headers:
+            self.request_handler.close_connection = True
+
+        if self.request_handler.close_connection:
+            self.headers['Connection'] = 'close'
+
+        ServerHandler.send_preamble(self)
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """Request handler serving several requests over a single connection (e.g. from a fleet gateway)"""
+    protocol_version = 'HTTP/1.1'
+
+    # Close idle connections after this amount of seconds
+    timeout = 30
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            self.handle_one_request()
+
+    def handle_one_request(self):
+        try:
+            self.raw_requestline = self.rfile.readline(65537)
+        except socket.timeout:
+            self.close_connection = True
+            return
+
+        if not self.raw_requestline:
+            self.close_connection = True
+            return
+
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ''
+            self.request_version = ''
+            self.command = ''
+            self.send_error(414)
+            return
+
+        if not self.parse_request():  # An error code has been sent, just exit
+            return
+
+        if self.path == '/api/teleop' and self.headers.get('Upgrade', '').lower() == 'websocket':
+            self.close_connection = True
+            self.handle_teleop()
+            return
+
+        # The app doesn't always read the whole request body, so don't reuse the connection after one
+        if int(self.headers.get('Content-Length') or 0):
+            self.close_connection = True
+
+        handler = KeepAliveServerHandler(self.rfile, self.wfile, self.get_stderr(), self.get_environ())
+        handler.request_handler = self  # backpointer for logging
+        handler.run(self.server.get_app())
+
+    def handle_teleop(self):
+        """Serve the teleop WebSocket over this connection"""
+        key = self.headers.get('Sec-WebSocket-Key')
+        if not key:
+            self.send_error(400, 'Missing Sec-WebSocket-Key')
+            return
+
+        self.wfile.write(handshake_response(key))
+        teleop_log.info('Teleop session of %s started', self.client_address[0])
+
+        # The channel idles between moves, so it outlives the timeout of an idle HTTP connection
+        self.connection.settimeout(TELEOP_IDLE_TIMEOUT)
+        try:
+            while True:
+                reply, closed = handle_teleop_frame(*read_frame(self.rfile.read))
+                if reply:
+                    self.wfile.write(reply)
+                if closed:
+                    break
+        except (OSError, EOFError, ValueError) as e:
+            teleop_log.error('Teleop session of %s failed: %r', self.client_address[0], e)
+        finally:
+            # Losing the operator is the same as releasing the dead-man switch
+            movement_control.set_speed(0, 0)
+            teleop_log.info('Teleop session of %s ended', self.client_address[0])
+
+    def log_message(self, format, *args):
+        # Goes through the logging queue instead of writing to stderr while serving
+        access_log.info('%s - - ' + format, self.address_string(), *args)
+
+
 # Define API server
 app = hug.API(__name__).http.server()
 
 # Define Client
 client = Client(app)
 
-if __name__ == '__main__':
-    print(INTRO)
+
+def run_threads(port):
+    """Run the control loops as threads, serving each connection in its own thread"""
+    global movement_control, sensor_control, screen_control, device_probe  # Used by the routes
 
     # Start threads
     movement_control = MovementControl(movement)
@@ -865,7 +1414,85 @@ if __name__ == '__main__':
     screen_control.setDaemon(True)
     screen_control.start()
 
+    # A single thread runs all action sequences
+    scheduler_thread = threading.Thread(target=scheduler.run)
+    scheduler_thread.setDaemon(True)
+    scheduler_thread.start()
+
     # Create a server listening on a specific port number
-    httpd = make_server('', port_number, app)
-    print("Serving on port {0}...".format(port_number))
+    httpd = make_server('', port, app, ThreadingWSGIServer, KeepAliveRequestHandler)
+    print("Serving on port {0}...".format(port))
+
+    # Probe the devices while we are already accepting requests
+    device_probe = DeviceProbe()
+    device_probe.setDaemon(True)
+    device_probe.start()
+
+    # Compress the static files and decode the sounds before they are first asked for
+    for job in (webapp_files.preload, docs_files.preload, preload_sounds):
+        preloader = threading.Thread(target=job)
+        preloader.setDaemon(True)
+        preloader.start()
+
     httpd.serve_forever()
+
+
+def run_asyncio(port):
+    """Run the control loops and the server as cooperative tasks in a single event loop"""
+    global movement_control, sensor_control, screen_control, device_probe  # Used by the routes
+
+    loop = asyncio.get_event_loop()
+
+    # Create the tasks
+    movement_control = AsyncMovementControl(movement)
+    sensor_control = AsyncSensorControl(sensors, config['actions'])
+    screen_control = AsyncScreenControl()
+    for control in (movement_control, sensor_control, screen_control):
+        asyncio.ensure_future(control.run())
+    asyncio.ensure_future(scheduler.run_async())
+
+    # Create a server listening on a specific port number
+    # Setting a device config probes the devices (for seconds), so those requests don't run on the loop
+    httpd = AsyncWSGIServer(app, port, upgrades={'/api/teleop': serve_teleop_async}, offload=probing_routes)
+    loop.run_until_complete(httpd.start())
+    print("Serving on port {0} (asyncio runtime)...".format(port))
+
+    # Probing, compressing and decoding block, so they run in a single short-lived worker thread
+    device_probe = DeviceProbe()
+    executor = ThreadPoolExecutor(1)
+    for job in (device_probe.run, webapp_files.preload, docs_files.preload, preload_sounds):
+        loop.run_in_executor(executor, job)
+    executor.shutdown(wait=False)
+
+    loop.run_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Lego Mindstorms REST API')
+    parser.add_argument('--port', type=int, default=port_number, help='port number to serve on')
+    parser.add_argument('--runtime', choices=['threads', 'asyncio'], default='threads',
+                        help='run the control loops as threads or as tasks in a single event loop')
+    parser.add_argument('--sound-output', default='aplay',
+                        help='where sounds are played: aplay, null or the path of a WAV file to write to')
+    parser.add_argument('--sound-idle-timeout', type=float,
+                        help='seconds of silence after which the sound output is released (default: keep it open)')
+    parser.add_argument('--log-file', default='server.log',
+                        help='rotating file receiving the logs as JSON lines (empty to disable)')
+    parser.add_argument('--log-size', type=int, default=1024 * 1024,
+                        help='maximum size (in bytes) of the log file before it rotates, 3 rotated files are kept')
+    args = parser.parse_args()
+
+    # Log from a background thread, so logging never blocks a request or an action
+    log_listener = setup_logging(args.log_file, args.log_size)
+    atexit.register(log_listener.stop)
+
+    mixer.sink = open_sink(args.sound_output)
+    mixer.idle_timeout = args.sound_idle_timeout
+    atexit.register(mixer.sink.close)
+
+    print(INTRO)
+
+    if args.runtime == 'asyncio':
+        run_asyncio(args.port)
+    else:
+        run_threads(args.port)
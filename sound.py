@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+import io
+import os
+import time
+import wave
+# Removed from the standard library in Python 3.13, the `audioop-lts` package provides it there
+import audioop
+import threading
+import subprocess
+
+from collections import OrderedDict
+
+# Format of the decoded sounds and the output stream (16-bit mono is all the brick's speaker can do)
+RATE = 22050
+CHANNELS = 1
+WIDTH = 2
+
+
+def decode_wav(path):
+    """Decode a WAV file (a path or a file object) into PCM in the output format"""
+    with wave.open(path, 'rb') as f:
+        channels, width, rate = f.getnchannels(), f.getsampwidth(), f.getframerate()
+        data = f.readframes(f.getnframes())
+
+    if width == 1:
+        # 8-bit WAV samples are unsigned, all other widths are signed
+        data = audioop.bias(data, 1, -128)
+    if width != WIDTH:
+        data = audioop.lin2lin(data, width, WIDTH)
+    if channels == 2 and CHANNELS == 1:
+        data = audioop.tomono(data, WIDTH, 0.5, 0.5)
+    elif channels != CHANNELS:
+        raise wave.Error('Unsupported number of channels: %d' % channels)
+    if rate != RATE:
+        data, _ = audioop.ratecv(data, WIDTH, CHANNELS, rate, RATE, None)
+    return data
+
+
+def synthesize(text, espeak_opts=('-a', '200', '-s', '130')):
+    """Speak text with espeak, decoded into PCM in the output format"""
+    wav = subprocess.run(['espeak', '--stdout'] + list(espeak_opts) + [text],
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True).stdout
+    return decode_wav(io.BytesIO(wav))
+
+
+def mix(chunks, size):
+    """Mix PCM chunks into a single chunk of `size` bytes, samples saturate instead of wrapping around"""
+    mixed = None
+    for chunk in chunks:
+        if len(chunk) < size:
+            chunk += bytes(size - len(chunk))
+        mixed = chunk if mixed is None else audioop.add(mixed, chunk, WIDTH)
+    return mixed if mixed is not None else bytes(size)
+
+
+class SoundCache:
+    """In-memory cache of decoded sounds, the least recently played sounds are dropped beyond `max_bytes`"""
+
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.sounds = OrderedDict()
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        """Get a decoded sound, decoding it on the first hit (or when it changed on disk)"""
+        mtime = os.path.getmtime(path)
+        with self.lock:
+            cached = self.sounds.get(path)
+            if cached is not None and cached[0] == mtime:
+                self.sounds.move_to_end(path)
+                return cached[1]
+
+        data = decode_wav(path)
+        if len(data) > self.max_bytes:
+            # Too large to keep, so it's decoded on every play
+            return data
+
+        with self.lock:
+            replaced = self.sounds.pop(path, None)
+            if replaced is not None:
+                self.total -= len(replaced[1])
+            self.sounds[path] = (mtime, data)
+            self.total += len(data)
+            while self.total > self.max_bytes:
+                self.total -= len(self.sounds.popitem(last=False)[1][1])
+        return data
+
+    def preload(self, paths):
+        """Decode the given sounds (as long as they fit)"""
+        for path in paths:
+            try:
+                self.get(path)
+            except (OSError, EOFError, wave.Error):
+                pass
+
+    def size(self):
+        """Get the amount of bytes kept in memory"""
+        return self.total
+
+
+class AplaySink:
+    """Output stream to the speaker, a single `aplay` process is kept open for all sounds"""
+    realtime = True
+
+    def __init__(self):
+        self.process = None
+
+    def write(self, data):
+        if self.process is None or self.process.poll() is not None:
+            self.process = subprocess.Popen(['aplay', '-q', '-t', 'raw', '-f', 'S16_LE',
+                                             '-r', str(RATE), '-c', str(CHANNELS)],
+                                            stdin=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            self.process.stdin.write(data)
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            # aplay died, it's restarted on the next write
+            self.process = None
+
+    def idle(self):
+        # Release the speaker (the brick has a single PCM stream), aplay is restarted on the next write
+        self.close()
+
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+            self.process = None
+
+
+class NullSink:
+    """Output stream discarding the sound (only counting the bytes)"""
+    realtime = False
+
+    def __init__(self):
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+
+    def idle(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FileSink:
+    """Output stream writing the sound to a WAV file"""
+    realtime = False
+
+    def __init__(self, path):
+        self.file = wave.open(path, 'wb')
+        self.file.setnchannels(CHANNELS)
+        self.file.setsampwidth(WIDTH)
+        self.file.setframerate(RATE)
+
+    def write(self, data):
+        self.file.writeframes(data)
+
+    def idle(self):
+        pass
+
+    def close(self):
+        self.file.close()
+
+
+def open_sink(output):
+    """Open an output stream: `aplay`, `null` or the path of a WAV file"""
+    if output == 'aplay':
+        return AplaySink()
+    elif output == 'null':
+        return NullSink()
+    return FileSink(output)
+
+
+class Mixer(threading.Thread):
+    """
+    Thread mixing the playing sounds into the output stream, period by period. It's
+    started by the first sound played and idles (without writing) while it's silent.
+    The output stays open, so sounds start without delay, unless `idle_timeout` is
+    given: then it's released once it's been silent for that amount of seconds.
+    """
+
+    def __init__(self, sink, period=0.02, lead=0.06, idle_timeout=None):
+        self.sink = sink
+        self.period = period
+        # Amount of seconds we write ahead of the speaker, enough to not run dry
+        self.lead = lead
+        self.idle_timeout = idle_timeout
+        self.chunk_size = int(RATE * period) * CHANNELS * WIDTH
+        self.clips = []
+        self.running = True
+        self.lock = threading.Lock()
+        self.e = threading.Event()
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+
+    def play(self, data):
+        """Start playing a decoded sound, on top of the sounds that are already playing"""
+        with self.lock:
+            self.clips.append([data, 0])
+            if self.ident is None:
+                self.start()
+        self.e.set()
+
+    def silence(self):
+        """Stop playing all sounds"""
+        with self.lock:
+            self.clips = []
+
+    def run(self):
+        written_until = time.time()
+        idle = True
+        while self.running:
+            # Block until there's something to play.
+            if not self.e.wait(None if idle or self.idle_timeout is None else self.idle_timeout):
+                self.sink.idle()
+                idle = True
+                continue
+            idle = False
+
+            with self.lock:
+                chunks = [data[offset:offset + self.chunk_size] for data, offset in self.clips]
+                for clip in self.clips:
+                    clip[1] += self.chunk_size
+                self.clips = [clip for clip in self.clips if clip[1] < len(clip[0])]
+                if not self.clips:
+                    # Reset the internal flag to false.
+                    self.e.clear()
+
+            if not chunks:
+                continue
+            self.sink.write(mix(chunks, self.chunk_size))
+
+            if self.sink.realtime:
+                # Stay `lead` seconds ahead of the speaker, instead of filling the pipe with seconds of sound
+                now = time.time()
+                written_until = max(written_until, now) + self.period
+                time.sleep(max(0, written_until - now - self.lead))
+
+    def stop(self):
+        self.running = False
+        self.e.set()
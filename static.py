@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+import os
+import gzip
+import hashlib
+import mimetypes
+import threading
+
+from email.utils import formatdate
+
+try:
+    import brotli
+except ImportError:
+    # Brotli is optional, without it we only serve gzip
+    brotli = None
+
+# Content types that are worth compressing
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/xml', 'image/svg+xml')
+
+# Extensions that are skipped while preloading (only requested by the browser's developer tools)
+SKIP_PRELOAD = ('.map',)
+
+
+def parse_accept_encoding(header):
+    """Parse an Accept-Encoding header into a dict of {encoding: quality}"""
+    accepted = {}
+    for item in (header or '').split(','):
+        parts = item.strip().split(';')
+        encoding = parts[0].strip().lower()
+        if not encoding:
+            continue
+
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[encoding] = quality
+    return accepted
+
+
+class StaticFile:
+    """A static file kept in memory, precompressed in every encoding we can serve (when `compress` is set)"""
+
+    def __init__(self, path, compress=True, min_size=256):
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        self.mtime = os.path.getmtime(path)
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        self.encodings = {'identity': content}
+        self.compressed = compress
+
+        # Moderate levels: the highest ones cost many times the CPU (minutes on the brick) for a few percent
+        if compress and len(content) >= min_size and self.content_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(content, 6)
+            if len(compressed) < len(content):
+                self.encodings['gzip'] = compressed
+
+            if brotli is not None:
+                compressed = brotli.compress(content, quality=5)
+                if len(compressed) < len(content):
+                    self.encodings['br'] = compressed
+
+        # Every encoding is a different representation, so it gets its own entity tag
+        digest = hashlib.sha1(content).hexdigest()[:16]
+        self.etags = {encoding: '"%s"' % digest if encoding == 'identity' else '"%s-%s"' % (digest, encoding)
+                      for encoding in self.encodings}
+
+    def negotiate(self, accept_encoding):
+        """Get the smallest encoding the client accepts"""
+        accepted = parse_accept_encoding(accept_encoding)
+        candidates = [encoding for encoding in self.encodings
+                      if encoding == 'identity' or accepted.get(encoding, accepted.get('*', 0)) > 0]
+        return min(candidates, key=lambda encoding: len(self.encodings[encoding]))
+
+
+class StaticCache:
+    """In-memory cache of the static files within a directory"""
+
+    def __init__(self, directory, max_age=3600):
+        self.directory = os.path.abspath(directory)
+        self.max_age = max_age
+        self.files = {}
+        self.lock = threading.Lock()
+
+    def resolve(self, filename):
+        """Resolve a requested filename to a path within the directory, `None` if there's no such file"""
+        path = os.path.abspath(os.path.join(self.directory, filename.lstrip('/')))
+        if path != self.directory and not path.startswith(self.directory + os.sep):
+            return None
+
+        if os.path.isdir(path):
+            path = os.path.join(path, 'index.html')
+
+        return path if os.path.isfile(path) else None
+
+    def load(self, path, compress):
+        """Load a file, unless it's already loaded (and compressed, if asked for) and unchanged on disk"""
+        static_file = self.files.get(path)
+        if static_file is None or static_file.mtime != os.path.getmtime(path) or \
+                (compress and not static_file.compressed):
+            static_file = StaticFile(path, compress)
+            with self.lock:
+                self.files[path] = static_file
+        return static_file
+
+    def get(self, filename):
+        """
+        Get a static file, loading it on the first hit (or when it changed on disk).
+        Compressing is left to the preloader, so a request never waits for it.
+        """
+        path = self.resolve(filename)
+        if path is None:
+            return None
+        return self.load(path, False)
+
+    def preload(self):
+        """Load and compress every file within the directory"""
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(SKIP_PRELOAD):
+                    continue
+                self.load(os.path.join(root, name), True)
+
+    def size(self):
+        """Get the amount of bytes kept in memory"""
+        with self.lock:
+            return sum(len(data) for static_file in self.files.values() for data in static_file.encodings.values())
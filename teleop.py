@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+import json
+import base64
+import struct
+import hashlib
+
+# Magic string of the WebSocket handshake (RFC 6455)
+GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+# Largest payload we accept, setpoints are tiny
+MAX_PAYLOAD = 1024
+
+# Stop the motors when no setpoint arrives within this amount of seconds
+DEADMAN_TIMEOUT = 0.5
+
+# Close the channel when nothing (not even a keepalive) arrives within this amount of seconds
+IDLE_TIMEOUT = 60
+
+
+def direction_speeds(direction, speed_percentage):
+    """Get the speed of the left and right side to move towards a direction"""
+    left_speed = speed_percentage
+    right_speed = speed_percentage
+    if direction == 'forward':
+        left_speed *= -1
+        right_speed *= -1
+    elif direction == 'left':
+        right_speed *= -1
+    elif direction == 'right':
+        left_speed *= -1
+    return left_speed, right_speed
+
+
+def handshake_response(key):
+    """Get the response accepting a WebSocket handshake"""
+    accept = base64.b64encode(hashlib.sha1((key + GUID).encode('ascii')).digest()).decode('ascii')
+    return ('HTTP/1.1 101 Switching Protocols\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            'Sec-WebSocket-Accept: %s\r\n\r\n' % accept).encode('ascii')
+
+
+def encode_frame(opcode, payload=b''):
+    """Encode a (server to client, so unmasked) frame"""
+    if len(payload) < 126:
+        header = struct.pack('!BB', 0x80 | opcode, len(payload))
+    elif len(payload) < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, len(payload))
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, len(payload))
+    return header + payload
+
+
+def parse_header(header):
+    """Parse the first two bytes of a frame into (opcode, masked, length)"""
+    opcode = header[0] & 0x0F
+    masked = bool(header[1] & 0x80)
+    length = header[1] & 0x7F
+    return opcode, masked, length
+
+
+def unmask(mask, payload):
+    """Unmask the payload of a client frame"""
+    return bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+
+
+def read_frame(read):
+    """Read a frame using a blocking `read(n)` function, returns (opcode, payload)"""
+    def read_exactly(n):
+        data = read(n)
+        if len(data) < n:
+            raise EOFError('Connection closed')
+        return data
+
+    opcode, masked, length = parse_header(read_exactly(2))
+    if length == 126:
+        length = struct.unpack('!H', read_exactly(2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', read_exactly(8))[0]
+    if length > MAX_PAYLOAD:
+        raise ValueError('Frame too large')
+
+    mask = read_exactly(4) if masked else None
+    payload = read_exactly(length) if length else b''
+
+    return opcode, unmask(mask, payload) if masked else payload
+
+
+async def read_frame_async(reader):
+    """Read a frame from an asyncio stream, returns (opcode, payload)"""
+    opcode, masked, length = parse_header(await reader.readexactly(2))
+    if length == 126:
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', await reader.readexactly(8))[0]
+    if length > MAX_PAYLOAD:
+        raise ValueError('Frame too large')
+
+    mask = await reader.readexactly(4) if masked else None
+    payload = await reader.readexactly(length) if length else b''
+
+    return opcode, unmask(mask, payload) if masked else payload
+
+
+def parse_setpoint(opcode, payload):
+    """
+    Parse a setpoint frame into (left_speed, right_speed). A binary frame holds
+    two signed bytes (left and right duty cycle), a text frame holds either
+    `{"left": -50, "right": 50}` or `{"direction": "forward", "speed": 100}`.
+    Returns `None` for a keepalive (`{"ping": true}`), sent while idle since
+    browsers can't send ping frames.
+    """
+    if opcode == OPCODE_BINARY:
+        if len(payload) != 2:
+            raise ValueError('Binary setpoint must be 2 bytes')
+        left_speed, right_speed = struct.unpack('bb', payload)
+    else:
+        data = json.loads(payload.decode('utf8'))
+        if 'ping' in data:
+            return None
+        if 'direction' in data:
+            if data['direction'] not in ('forward', 'backward', 'left', 'right'):
+                raise ValueError('Unknown direction')
+            if not 0 <= int(data['speed']) <= 100:
+                raise ValueError('Speed out of range')
+            left_speed, right_speed = direction_speeds(data['direction'], int(data['speed']))
+        else:
+            left_speed, right_speed = int(data['left']), int(data['right'])
+
+    if not -100 <= left_speed <= 100 or not -100 <= right_speed <= 100:
+        raise ValueError('Speed out of range')
+    return left_speed, right_speed
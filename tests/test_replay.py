@@ -0,0 +1,46 @@
+import os
+
+from replay import Replay, compare_calls, load_actions, read_json
+
+TRACES = os.path.join(os.path.dirname(__file__), 'traces')
+
+
+def replay_trace():
+    """Replay the trace through the actions (and/or/not conditions, repeated and parallel steps)"""
+    replay = Replay(load_actions(os.path.join(TRACES, 'actions.json')))
+    replay.run(read_json(os.path.join(TRACES, 'trace.json')))
+    return replay.calls
+
+
+def test_trace_matches_recording():
+    assert compare_calls(replay_trace(), read_json(os.path.join(TRACES, 'expected.json'))) == []
+
+
+def test_differences_are_reported():
+    expected = read_json(os.path.join(TRACES, 'expected.json'))
+    expected[3]['time'] += 0.01
+    del expected[-1]
+
+    differences = compare_calls(replay_trace(), expected)
+    assert len(differences) == 2
+    assert differences[0].startswith('Call 3:')
+
+
+def test_flipped_outcome_cancels_the_previous_sequence():
+    replay = Replay([{
+        'address': 'in1',
+        'action': 'is_pressed',
+        'condition': {'comparison': '==', 'compare_with': 1},
+        'when_true': [{'method': 'POST', 'url': '/api/sound/0', 'wait': 1, 'repeat': 0}],
+        'when_false': [{'method': 'POST', 'url': '/api/movement/forward/0'}]
+    }])
+    for when, is_pressed in ((0, 0), (1, 1), (2.5, 0), (3, 1), (3.5, 0)):
+        replay.feed({'time': when, 'sensors': {'in1': {'is_pressed': is_pressed}}})
+    replay.advance_to(10)
+
+    assert [(call['time'], call['url']) for call in replay.calls] == [
+        (0, '/api/movement/forward/0'),
+        (1, '/api/sound/0'), (2, '/api/sound/0'), (2.5, '/api/movement/forward/0'),
+        (3, '/api/sound/0'), (3.5, '/api/movement/forward/0')
+    ]
+    assert replay.scheduler.status() == []
@@ -0,0 +1,70 @@
+import json
+import time
+import asyncio
+
+import server
+from runtime import WSGIServer
+
+
+async def request(port, method, path, body=''):
+    """Perform a request, returns its status line"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    data = body.encode('utf-8')
+    writer.write(('%s %s HTTP/1.1\r\nContent-Type: application/json\r\nContent-Length: %d\r\nConnection: close\r\n\r\n'
+                  % (method, path, len(data))).encode('iso-8859-1') + data)
+    response = await reader.read()
+    writer.close()
+    return response.split(b'\r\n', 1)[0].decode('iso-8859-1')
+
+
+def test_loop_stays_responsive_while_probing(monkeypatch):
+    def slow_probe(motor_config):
+        time.sleep(1)
+        return {}
+
+    monkeypatch.setattr(server, 'parse_motor_config', slow_probe)
+    monkeypatch.setattr(server, 'save_json', lambda filename, data: None)
+    monkeypatch.setattr(server, 'movement_control', server.MovementControl({}), raising=False)
+    monkeypatch.setattr(server, 'sensor_control', server.SensorControl({}, server.config['actions']), raising=False)
+
+    loop = asyncio.new_event_loop()
+    httpd = WSGIServer(server.app, 0, '127.0.0.1', offload=server.probing_routes)
+
+    async def measure():
+        await httpd.start()
+        port = httpd.server.sockets[0].getsockname()[1]
+
+        # Largest delay of a 10 ms tick, like the control loops of the runtime use
+        ticks = {'max_gap': 0, 'running': True}
+
+        async def tick():
+            last = time.time()
+            while ticks['running']:
+                await asyncio.sleep(0.01)
+                now = time.time()
+                ticks['max_gap'] = max(ticks['max_gap'], now - last)
+                last = now
+        ticker = asyncio.ensure_future(tick())
+
+        push = asyncio.ensure_future(request(port, 'POST', '/api/motor/config/', json.dumps({'outA': 'large'})))
+        await asyncio.sleep(0.1)
+
+        start = time.time()
+        statuses = [await request(port, 'GET', '/api/ready'),
+                    await request(port, 'POST', '/api/action/config', json.dumps(list(server.config['actions'])))]
+        inline_duration = time.time() - start
+
+        statuses.append(await push)
+        ticks['running'] = False
+        await ticker
+        httpd.close()
+        return statuses, inline_duration, ticks['max_gap']
+
+    try:
+        statuses, inline_duration, max_gap = loop.run_until_complete(measure())
+    finally:
+        loop.close()
+
+    assert statuses == ['HTTP/1.1 200 OK'] * 3
+    assert inline_duration < 0.5
+    assert max_gap < 0.5
@@ -0,0 +1,42 @@
+from scheduler import Scheduler
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cancel_in_the_tick_of_a_due_timer():
+    clock = VirtualClock()
+    calls = []
+
+    def execute(step):
+        calls.append(step['url'])
+        if step['url'] == '/api/motor/killswitch':
+            scheduler.cancel_all()
+
+    scheduler = Scheduler(execute, clock, tick=0.01)
+
+    # Both branches are due in the same tick, the first one cancels the sequence while the timer of
+    # the second one is already taken off the wheel
+    scheduler.start([{'parallel': [
+        {'steps': [{'method': 'GET', 'url': '/a', 'wait': 0.5},
+                   {'method': 'POST', 'url': '/api/motor/killswitch'}]},
+        {'steps': [{'method': 'GET', 'url': '/b', 'wait': 0.5},
+                   {'method': 'GET', 'url': '/c'}]}
+    ]}])
+    clock.now = 1
+    scheduler.run_due()
+    assert calls == ['/a', '/b', '/api/motor/killswitch']
+    assert scheduler.wheel.pending == 0
+
+    # A sequence started afterwards still gets its timer (and `run` a timeout to wait for it)
+    scheduler.start([{'method': 'GET', 'url': '/x', 'wait': 0.3}, {'method': 'GET', 'url': '/y'}])
+    assert scheduler.run_due() is True
+    clock.now = 2
+    assert scheduler.run_due() is False
+    assert calls[-2:] == ['/x', '/y']
+    assert scheduler.status() == []
@@ -24,7 +24,23 @@ let map = {
 
 let output = $('#history-output'); // where output is sent
 
+// Teleoperation channel (the REST API is used while it's not open)
+let teleop = null;
+
+// Current teleop setpoint, repeated while moving
+let setpoint = null;
+
+// Interval (in ms) to repeat the setpoint, must stay below the server's dead-man timeout (500 ms)
+let heartbeatInterval = 200;
+let heartbeat = null;
+
+// Interval (in ms) to send a keepalive while idle, must stay below the server's idle timeout (60 s)
+let keepaliveInterval = 15000;
+let keepalive = null;
+
 $(document).ready(function () {
+    connectTeleop();
+
     $('#up-arrow, #down-arrow, #left-arrow, #right-arrow').on('click', function () {
         let direction = $(this).data('direction');
 
@@ -281,6 +297,63 @@ function killSwitch() {
  * Movement API.
  */
 
+/**
+ * Open the teleoperation channel
+ */
+function connectTeleop() {
+    let protocol = location.protocol === 'https:' ? 'wss:' : 'ws:';
+    teleop = new WebSocket(`${protocol}//${location.host}/api/teleop`);
+    teleop.onopen = function () {
+        // Keep the channel open between moves, while moving the repeated setpoint does
+        keepalive = setInterval(function () {
+            if (heartbeat === null && teleop !== null && teleop.readyState === WebSocket.OPEN) {
+                teleop.send(JSON.stringify({ping: true}));
+            }
+        }, keepaliveInterval);
+    };
+    teleop.onclose = function () {
+        teleop = null;
+
+        // Don't repeat an old setpoint over a new channel
+        clearInterval(heartbeat);
+        heartbeat = null;
+        clearInterval(keepalive);
+        keepalive = null;
+    };
+}
+
+/**
+ * Send a setpoint over the teleoperation channel
+ *
+ * @param {String} direction Direction
+ * @param {Number} speed Set the speed of the motor (in percentage)
+ * @returns {Boolean} Whether the setpoint is sent
+ */
+function sendSetpoint(direction, speed) {
+    if (teleop === null || teleop.readyState !== WebSocket.OPEN) {
+        // Reconnect for the next setpoint
+        if (teleop === null) {
+            connectTeleop();
+        }
+        return false;
+    }
+
+    setpoint = JSON.stringify({direction: direction, speed: Number(speed)});
+    teleop.send(setpoint);
+
+    // Keep repeating the setpoint while moving, otherwise the robot stops
+    clearInterval(heartbeat);
+    heartbeat = null;
+    if (Number(speed) !== 0) {
+        heartbeat = setInterval(function () {
+            if (teleop !== null && teleop.readyState === WebSocket.OPEN) {
+                teleop.send(setpoint);
+            }
+        }, heartbeatInterval);
+    }
+    return true;
+}
+
 /**
  * Move robot towards a specific direction
  *
@@ -288,6 +361,10 @@ function killSwitch() {
  * @param {Number} speed Set the speed of the motor (in percentage)
  */
 function moveRobot(direction, speed) {
+    if (sendSetpoint(direction, speed)) {
+        return;
+    }
+
     let url = `/api/movement/${direction}/${speed}`;
 
     // Send the data using post
@@ -326,6 +403,10 @@ function updateMovementConfig(config) {
  * Stops any movement
  */
 function stopMovement() {
+    if (sendSetpoint('forward', 0)) {
+        return;
+    }
+
     let url = '/api/movement/forward/0';
 
     // Send the data using post